@@ -0,0 +1,105 @@
+from utils import Action, Claim, Rules, DEFAULT_RULES
+
+from typing import Dict, List, Sequence, Tuple
+
+UNTARGETED_ACTIONS: List[Action] = [Action.INCOME, Action.FOREIGN_AID, Action.TAX, Action.EXCHANGE]
+TARGETED_ACTIONS: List[Action] = [Action.STEAL, Action.ASSASSINATE, Action.COUP]
+# blocks are targeted at the instigator of the blocked action
+BLOCK_ACTIONS: List[Action] = [Action.BLOCK_STEALING, Action.BLOCK_ASSASSINATE, Action.BLOCK_FOREIGN_AID]
+BLOCKS: Dict[Action, Action] = {
+    Action.STEAL: Action.BLOCK_STEALING,
+    Action.ASSASSINATE: Action.BLOCK_ASSASSINATE,
+    Action.FOREIGN_AID: Action.BLOCK_FOREIGN_AID,
+}
+
+NO_RESPONSE: Claim = Claim(Action.NO_RESPONSE, None)
+
+def coin_bracket(coins: int, rules: Rules = DEFAULT_RULES) -> int:
+    # the legal claims only change at the assassination cost, the coup cost and the forced coup threshold
+    if coins < rules.assassination_cost:
+        return 0
+    if coins < rules.coup_cost:
+        return 1
+    if coins < rules.forced_coup_coins:
+        return 2
+    return 3
+
+# every claim that can be made in a game gets a stable integer id, the ids only depend on
+# the seat of the player a claim targets so learned agents see a fixed action space:
+#   untargeted actions, no response, then per seat the targeted actions followed by the blocks
+class ActionTable:
+    def __init__(self, names: Sequence[str], rules: Rules = DEFAULT_RULES) -> None:
+        self._names: List[str] = list(names)
+        self._rules: Rules = rules
+        self._claims: List[Claim] = [Claim(action, None) for action in UNTARGETED_ACTIONS]
+        self._claims.append(NO_RESPONSE)
+        for name in self._names:
+            for action in TARGETED_ACTIONS + BLOCK_ACTIONS:
+                self._claims.append(Claim(action, name))
+
+        self._ids: Dict[Claim, int] = {claim: claim_id for claim_id, claim in enumerate(self._claims)}
+        self._action_claims: Dict[Tuple[Tuple[str, ...], int], Tuple[Tuple[Claim, ...], int]] = {}
+        self._block_claims: Dict[Tuple[str, Action], Tuple[Tuple[Claim, ...], int]] = {}
+
+    @property
+    def names(self) -> List[str]:
+        return self._names
+
+    @property
+    def rules(self) -> Rules:
+        return self._rules
+
+    @property
+    def num_actions(self) -> int:
+        return len(self._claims)
+
+    def claim(self, claim_id: int) -> Claim:
+        return self._claims[claim_id]
+
+    def claim_id(self, claim: Claim) -> int:
+        return self._ids[claim]
+
+    def is_legal(self, claim: Claim, legal_mask: int) -> bool:
+        claim_id = self._ids.get(claim)
+        return claim_id is not None and (legal_mask >> claim_id) & 1 == 1
+
+    def mask_of(self, claims: Sequence[Claim]) -> int:
+        legal_mask: int = 0
+        for claim in claims:
+            legal_mask |= 1 << self._ids[claim]
+        return legal_mask
+
+    def action_claims(self, other_players: Sequence[str], coins: int) -> Tuple[Tuple[Claim, ...], int]:
+        # the returned tuple is shared between decisions and must not be modified
+        key = (tuple(other_players), coin_bracket(coins, self._rules))
+        entry = self._action_claims.get(key)
+        if entry is None:
+            entry = self._build_action_claims(*key)
+            self._action_claims[key] = entry
+        return entry
+
+    def block_claims(self, instigator: str, action: Action) -> Tuple[Tuple[Claim, ...], int]:
+        key = (instigator, action)
+        entry = self._block_claims.get(key)
+        if entry is None:
+            legal_claims: List[Claim] = [NO_RESPONSE]
+            if action in BLOCKS:
+                legal_claims.append(self._claims[self._ids[Claim(BLOCKS[action], instigator)]])
+            entry = (tuple(legal_claims), self.mask_of(legal_claims))
+            self._block_claims[key] = entry
+        return entry
+
+    def _build_action_claims(self, other_players: Tuple[str, ...], bracket: int) -> Tuple[Tuple[Claim, ...], int]:
+        legal_claims: List[Claim] = []
+        if bracket < 3:
+            legal_claims.extend(self._claims[:len(UNTARGETED_ACTIONS)])
+            legal_claims.extend(self._targeted(Action.STEAL, other_players))
+        if bracket in (1, 2):
+            legal_claims.extend(self._targeted(Action.ASSASSINATE, other_players))
+        if bracket >= 2:
+            legal_claims.extend(self._targeted(Action.COUP, other_players))
+
+        return tuple(legal_claims), self.mask_of(legal_claims)
+
+    def _targeted(self, action: Action, other_players: Tuple[str, ...]) -> List[Claim]:
+        return [self._claims[self._ids[Claim(action, player_name)]] for player_name in other_players]
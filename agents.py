@@ -1,24 +1,35 @@
-from utils import Action, Claim, Character, PlayerPerspective, GameState
+from utils import Action, Claim, Character, PlayerPerspective, GameState, Rules, DEFAULT_RULES, CLAIMED_CHARACTERS
+from actions import ActionTable
+from encoding import PerspectiveEncoder
+from trajectory import DEFAULT_CAPACITY, TrajectoryBuffer, TrajectoryView
+from beliefs import BeliefTracker
 
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence
 from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor
 import random
 
 class Agent:
-    def __init__(self) -> None:
+    # agents whose challenge and block decisions change nothing but their random stream may be asked
+    # concurrently, the engine rewinds the stream of every answer the sequential order would not
+    # have asked for, see Game.set_poll_executor
+    concurrent_polling: bool = False
+
+    def __init__(self, rng: Optional[random.Random] = None, trajectory_capacity: int = DEFAULT_CAPACITY) -> None:
+        self._rng: random.Random = rng if rng is not None else random.Random()
         self._total_reward = 0.0
-        self._trajectory: List[Tuple[Claim, List[Claim], PlayerPerspective]] = []
+        self._trajectory: TrajectoryBuffer = TrajectoryBuffer(trajectory_capacity)
 
     @abstractmethod
     def choose_to_challenge(self, instigator: str, claim: Claim, player_perspective: Optional[PlayerPerspective]) -> bool:
         pass
 
     @abstractmethod
-    def choose_to_block(self, legal_responses: List[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]: # Changed return type
+    def choose_to_block(self, legal_responses: Sequence[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]: # Changed return type
         pass
 
     @abstractmethod
-    def choose_action(self, legal_claims: List[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
+    def choose_action(self, legal_claims: Sequence[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
         pass
 
     @abstractmethod
@@ -32,21 +43,39 @@ class Agent:
     def propogate_reward(self, reward: float) -> None:
         self._total_reward += reward
 
-    def extend_trajectory(self, claim: Claim, legal_claims: List[Claim], player_perspective: Optional[PlayerPerspective]) -> None:
+    def get_total_reward(self) -> float:
+        return self._total_reward
+
+    def set_rng(self, rng: random.Random) -> None:
+        self._rng = rng
+
+    def get_rng(self) -> random.Random:
+        return self._rng
+
+    def bind(self, action_table: ActionTable, encoder: PerspectiveEncoder) -> None:
+        self._trajectory.bind(action_table, encoder)
+
+    def extend_trajectory(self, claim: Claim, legal_mask: int, player_perspective: Optional[PlayerPerspective]) -> None:
         assert player_perspective is not None
 
-        self._trajectory.append((claim, legal_claims, player_perspective))
+        self._trajectory.append(claim, legal_mask, player_perspective)
+
+    def get_trajectory(self) -> TrajectoryView:
+        return self._trajectory.view()
 
-    def get_trajectory(self):
+    def get_trajectory_buffer(self) -> TrajectoryBuffer:
         return self._trajectory
 
     def reset_agent(self):
         self._total_reward = 0
-        self._trajectory = []
+        self._trajectory.clear()
+
+    def close(self) -> None:
+        pass
 
 class HumanInputAgent(Agent):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, rng: Optional[random.Random] = None, trajectory_capacity: int = DEFAULT_CAPACITY):
+        super().__init__(rng, trajectory_capacity)
 
     def display_perspective(self, perspective: Optional[PlayerPerspective]):
         if perspective is None:
@@ -67,7 +96,7 @@ class HumanInputAgent(Agent):
         choice = input("Do you want to challenge this claim? (y/n): ").strip().lower()
         return choice == 'y'
 
-    def choose_to_block(self, legal_responses: List[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
+    def choose_to_block(self, legal_responses: Sequence[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
@@ -84,7 +113,7 @@ class HumanInputAgent(Agent):
             return None
         return legal_responses[int(choice)]
 
-    def choose_action(self, legal_claims: List[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
+    def choose_action(self, legal_claims: Sequence[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
@@ -122,60 +151,73 @@ class HumanInputAgent(Agent):
         return chosen
 
 class RandomAgent(Agent):
-    def __init__(self):
-        super().__init__()
+    concurrent_polling: bool = True
+
+    def __init__(self, rng: Optional[random.Random] = None, trajectory_capacity: int = DEFAULT_CAPACITY):
+        super().__init__(rng, trajectory_capacity)
 
     def choose_to_challenge(self, instigator: str, claim: Claim, player_perspective: Optional[PlayerPerspective]) -> bool:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
-        return random.choice([True, False])
+        return self._rng.choice([True, False])
 
-    def choose_to_block(self, legal_responses: List[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
+    def choose_to_block(self, legal_responses: Sequence[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
         if not legal_responses:
             return None # Cannot block if there are no legal responses
-        return random.choice(legal_responses)
+        return self._rng.choice(legal_responses)
 
-    def choose_action(self, legal_claims: List[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
+    def choose_action(self, legal_claims: Sequence[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
-        return random.choice(legal_claims)
+        return self._rng.choice(legal_claims)
 
     def choose_character(self, characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> Character:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
-        return random.choice(characters)
+        return self._rng.choice(characters)
 
     def exchange_cards(self, num_cards_to_exchange: int, available_characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> List[Character]:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
-        return random.sample(available_characters, num_cards_to_exchange)
+        return self._rng.sample(available_characters, num_cards_to_exchange)
 
 class RuleBasedAgent(Agent):
-    def __init__(self):
-        super().__init__()
+    # with a belief tracker, built from the game's rules and also passed to the game as a logger, claims are only
+    # challenged when they are unlikely to be honest, otherwise challenges are random
+    concurrent_polling: bool = True
+
+    def __init__(self, rng: Optional[random.Random] = None, trajectory_capacity: int = DEFAULT_CAPACITY,
+                 beliefs: Optional[BeliefTracker] = None, challenge_threshold: float = 0.3):
+        super().__init__(rng, trajectory_capacity)
+        self._beliefs: Optional[BeliefTracker] = beliefs
+        self._challenge_threshold: float = challenge_threshold
 
     def choose_to_challenge(self, instigator: str, claim: Claim, player_perspective: Optional[PlayerPerspective]) -> bool:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
-        return random.choice([True, False])
+        if self._beliefs is not None:
+            honest: float = self._beliefs.claim_probability(instigator, claim.action, player_perspective.hidden_characters)
+            return honest < self._challenge_threshold
+
+        return self._rng.choice([True, False])
 
-    def choose_to_block(self, legal_responses: List[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
+    def choose_to_block(self, legal_responses: Sequence[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
         if not legal_responses:
             return None
-        return random.choice(legal_responses)
+        return self._rng.choice(legal_responses)
 
-    def choose_action(self, legal_claims: List[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
+    def choose_action(self, legal_claims: Sequence[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
@@ -215,16 +257,114 @@ class RuleBasedAgent(Agent):
             elif richest_player in players_to_assassinate:
                 return Claim(Action.ASSASSINATE, richest_player)
 
-        return random.choice(legal_claims) # backup incase heuristic falls flat
+        return self._rng.choice(legal_claims) # backup incase heuristic falls flat
+
+    def choose_character(self, characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> Character:
+        if player_perspective is None:
+            raise ValueError("Why is the player perspective None")
+
+        return self._rng.choice(characters)
+
+    def exchange_cards(self, num_cards_to_exchange: int, available_characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> List[Character]:
+        if player_perspective is None:
+            raise ValueError("Why is the player perspective None")
+
+        return self._rng.sample(available_characters, num_cards_to_exchange)
+
+# how much a character is worth keeping, used when revealing or exchanging without a search
+CHARACTER_PRIORITY: List[Character] = [Character.DUKE, Character.CAPTAIN, Character.ASSASSIN, Character.CONTESSA, Character.AMBASSADOR]
+
+class ISMCTSAgent(Agent):
+    # information set monte carlo tree search over its own actions: every iteration deals the unseen
+    # cards at random and plays the game out with random opponents. the subtree below the chosen
+    # action is kept for the next decision. challenges, blocks, reveals and exchanges are heuristic
+    concurrent_polling: bool = True
+
+    def __init__(self, rng: Optional[random.Random] = None, iterations: int = 200, time_budget: Optional[float] = None,
+                 exploration: float = 0.7, num_workers: int = 1, max_turns: int = 200,
+                 trajectory_capacity: int = DEFAULT_CAPACITY):
+        super().__init__(rng, trajectory_capacity)
+        self._iterations: int = iterations
+        self._time_budget: Optional[float] = time_budget
+        self._exploration: float = exploration
+        self._num_workers: int = num_workers
+        self._max_turns: int = max_turns
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._root = None
+        self._root_players: List[str] = []
+        self._rules: Rules = DEFAULT_RULES
+
+    def bind(self, action_table: ActionTable, encoder: PerspectiveEncoder) -> None:
+        super().bind(action_table, encoder)
+        self._rules = action_table.rules
+
+    def choose_to_challenge(self, instigator: str, claim: Claim, player_perspective: Optional[PlayerPerspective]) -> bool:
+        if player_perspective is None:
+            raise ValueError("Why is the player perspective None")
+
+        # only call a bluff when every copy of the claimed characters is accounted for
+        characters: Sequence[Character] = CLAIMED_CHARACTERS.get(claim.action, ())
+        seen: List[Character] = list(player_perspective.hidden_characters) + list(player_perspective.game_state.revealed_characters)
+        return len(characters) > 0 and all(seen.count(character) >= self._rules.copies_per_character for character in characters)
+
+    def choose_to_block(self, legal_responses: Sequence[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
+        if player_perspective is None:
+            raise ValueError("Why is the player perspective None")
+
+        for claim in legal_responses:
+            if any(character in player_perspective.hidden_characters for character in CLAIMED_CHARACTERS.get(claim.action, ())):
+                return claim
+        return legal_responses[0]
+
+    def choose_action(self, legal_claims: Sequence[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
+        if player_perspective is None:
+            raise ValueError("Why is the player perspective None")
+
+        if len(legal_claims) == 1:
+            self._root = None
+            return legal_claims[0]
+
+        from search import Node, run_search, search_in_worker
+
+        players: List[str] = sorted(player_perspective.game_state.player_states)
+        if self._root is None or players != self._root_players:
+            self._root = Node()
+            self._root_players = players
+        root = self._root
+
+        futures = []
+        if self._num_workers > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self._num_workers - 1)
+            futures = [self._executor.submit(search_in_worker, player_perspective, self._iterations, self._time_budget,
+                                             self._exploration, self._rng.randrange(2 ** 63), self._max_turns, self._rules)
+                       for _ in range(self._num_workers - 1)]
+
+        run_search(root, player_perspective, self._iterations, self._time_budget, self._exploration, self._rng, self._max_turns, self._rules)
+        for future in futures:
+            root.merge(future.result())
+
+        claim: Claim = max(legal_claims, key=lambda legal_claim: root.children[legal_claim].visits if legal_claim in root.children else -1)
+        self._root = root.children.get(claim)
+        return claim
 
     def choose_character(self, characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> Character:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
-        return random.choice(characters)
+        return max(characters, key=CHARACTER_PRIORITY.index)
 
     def exchange_cards(self, num_cards_to_exchange: int, available_characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> List[Character]:
         if player_perspective is None:
             raise ValueError("Why is the player perspective None")
 
-        return random.sample(available_characters, num_cards_to_exchange)
\ No newline at end of file
+        return sorted(available_characters, key=CHARACTER_PRIORITY.index, reverse=True)[:num_cards_to_exchange]
+
+    def reset_agent(self):
+        super().reset_agent()
+        self._root = None
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
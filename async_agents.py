@@ -0,0 +1,218 @@
+from utils import Action, Claim, Character, PlayerPerspective, Rules, DEFAULT_RULES
+from agents import Agent
+from logger import Logger, NullLogger
+from runner import GameResult, play_game
+from trajectory import DEFAULT_CAPACITY
+
+from abc import abstractmethod
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Awaitable, Callable, List, Optional, Sequence, TypeVar, Union
+import asyncio
+import random
+import threading
+
+T = TypeVar("T")
+
+# every game runs its engine on a thread, so at most this many games play at once by default
+MAX_ENGINE_THREADS: int = 64
+
+_engine_executor: Optional[ThreadPoolExecutor] = None
+_engine_executor_lock = threading.Lock()
+
+def _default_engine_executor() -> ThreadPoolExecutor:
+    global _engine_executor
+    with _engine_executor_lock:
+        if _engine_executor is None:
+            _engine_executor = ThreadPoolExecutor(max_workers=MAX_ENGINE_THREADS, thread_name_prefix="coup-engine")
+        return _engine_executor
+
+class AsyncAgent:
+    # the awaitable counterpart of Agent for agents behind sockets or model servers. a decision
+    # that takes longer than timeout seconds is replaced by the default_* answer. challenge and block
+    # decisions must change nothing but self._rng unless concurrent_polling is turned off
+    concurrent_polling: bool = True
+
+    def __init__(self, timeout: Optional[float] = None) -> None:
+        self.timeout: Optional[float] = timeout
+        self._rng: random.Random = random.Random()
+
+    @abstractmethod
+    async def choose_to_challenge(self, instigator: str, claim: Claim, player_perspective: Optional[PlayerPerspective]) -> bool:
+        pass
+
+    @abstractmethod
+    async def choose_to_block(self, legal_responses: Sequence[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
+        pass
+
+    @abstractmethod
+    async def choose_action(self, legal_claims: Sequence[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
+        pass
+
+    @abstractmethod
+    async def choose_character(self, characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> Character:
+        pass
+
+    @abstractmethod
+    async def exchange_cards(self, num_cards_to_exchange: int, available_characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> List[Character]:
+        pass
+
+    def default_to_challenge(self, instigator: str, claim: Claim) -> bool:
+        return False
+
+    def default_to_block(self, legal_responses: Sequence[Claim], action: Action) -> Optional[Claim]:
+        return legal_responses[0] # always the no response claim
+
+    def default_action(self, legal_claims: Sequence[Claim]) -> Claim:
+        for claim in legal_claims:
+            if claim.action == Action.INCOME:
+                return claim
+        return legal_claims[0] # forced to coup
+
+    def default_character(self, characters: List[Character]) -> Character:
+        return characters[0]
+
+    def default_exchange(self, num_cards_to_exchange: int, available_characters: List[Character]) -> List[Character]:
+        return available_characters[:num_cards_to_exchange]
+
+    def propogate_reward(self, reward: float) -> None:
+        pass
+
+    def set_rng(self, rng: random.Random) -> None:
+        self._rng = rng
+
+    def reset_agent(self) -> None:
+        pass
+
+class ThreadedAgent(AsyncAgent):
+    # runs a blocking agent, e.g. HumanInputAgent, on a worker thread so it does not stall the event
+    # loop. a decision that times out keeps its thread busy until the agent returns
+    def __init__(self, agent: Agent, timeout: Optional[float] = None, executor: Optional[Executor] = None) -> None:
+        super().__init__(timeout)
+        self._agent: Agent = agent
+        self._executor: Optional[Executor] = executor
+
+    @property  # type: ignore[override]
+    def concurrent_polling(self) -> bool:
+        return self._agent.concurrent_polling
+
+    async def choose_to_challenge(self, instigator: str, claim: Claim, player_perspective: Optional[PlayerPerspective]) -> bool:
+        return await self._run(self._agent.choose_to_challenge, instigator, claim, player_perspective)
+
+    async def choose_to_block(self, legal_responses: Sequence[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
+        return await self._run(self._agent.choose_to_block, legal_responses, action, player_perspective)
+
+    async def choose_action(self, legal_claims: Sequence[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
+        return await self._run(self._agent.choose_action, legal_claims, player_perspective)
+
+    async def choose_character(self, characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> Character:
+        return await self._run(self._agent.choose_character, characters, player_perspective)
+
+    async def exchange_cards(self, num_cards_to_exchange: int, available_characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> List[Character]:
+        return await self._run(self._agent.exchange_cards, num_cards_to_exchange, available_characters, player_perspective)
+
+    def propogate_reward(self, reward: float) -> None:
+        self._agent.propogate_reward(reward)
+
+    def set_rng(self, rng: random.Random) -> None:
+        self._agent.set_rng(rng)
+
+    def reset_agent(self) -> None:
+        self._agent.reset_agent()
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+class AsyncAgentBridge(Agent):
+    # the engine runs on a worker thread and calls this like any other agent, every decision is
+    # scheduled on the event loop and the engine thread waits for the answer or the timeout
+    def __init__(self, agent: AsyncAgent, loop: asyncio.AbstractEventLoop, trajectory_capacity: int = DEFAULT_CAPACITY) -> None:
+        super().__init__(None, trajectory_capacity)
+        self._agent: AsyncAgent = agent
+        self._loop: asyncio.AbstractEventLoop = loop
+        # bridges are created on the loop's thread, see play_game_async
+        self._loop_thread: int = threading.get_ident()
+        self._num_timeouts: int = 0
+        # one stream for both, so the engine can rewind the async agent's draws
+        self._agent.set_rng(self._rng)
+
+    @property  # type: ignore[override]
+    def concurrent_polling(self) -> bool:
+        return self._agent.concurrent_polling
+
+    @property
+    def num_timeouts(self) -> int:
+        return self._num_timeouts
+
+    def choose_to_challenge(self, instigator: str, claim: Claim, player_perspective: Optional[PlayerPerspective]) -> bool:
+        return self._decide(self._agent.choose_to_challenge(instigator, claim, player_perspective),
+                            lambda: self._agent.default_to_challenge(instigator, claim))
+
+    def choose_to_block(self, legal_responses: Sequence[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
+        return self._decide(self._agent.choose_to_block(legal_responses, action, player_perspective),
+                            lambda: self._agent.default_to_block(legal_responses, action))
+
+    def choose_action(self, legal_claims: Sequence[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
+        return self._decide(self._agent.choose_action(legal_claims, player_perspective),
+                            lambda: self._agent.default_action(legal_claims))
+
+    def choose_character(self, characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> Character:
+        return self._decide(self._agent.choose_character(characters.copy(), player_perspective),
+                            lambda: self._agent.default_character(characters))
+
+    def exchange_cards(self, num_cards_to_exchange: int, available_characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> List[Character]:
+        return self._decide(self._agent.exchange_cards(num_cards_to_exchange, available_characters.copy(), player_perspective),
+                            lambda: self._agent.default_exchange(num_cards_to_exchange, available_characters))
+
+    def propogate_reward(self, reward: float) -> None:
+        super().propogate_reward(reward)
+        self._agent.propogate_reward(reward)
+
+    def set_rng(self, rng: random.Random) -> None:
+        super().set_rng(rng)
+        self._agent.set_rng(rng)
+
+    def reset_agent(self):
+        super().reset_agent()
+        self._agent.reset_agent()
+
+    def _decide(self, decision: Awaitable[T], default: Callable[[], T]) -> T:
+        if threading.get_ident() == self._loop_thread:
+            raise RuntimeError("The engine must not run on the event loop thread, use play_game_async")
+
+        future = asyncio.run_coroutine_threadsafe(_with_timeout(decision, self._agent.timeout), self._loop)
+        try:
+            return future.result()
+        except asyncio.TimeoutError:
+            self._num_timeouts += 1
+            return default()
+
+async def _with_timeout(decision: Awaitable[T], timeout: Optional[float]) -> T:
+    return await asyncio.wait_for(decision, timeout)
+
+async def play_game_async(agents: Sequence[Union[Agent, AsyncAgent]], logger: Optional[Logger] = None, max_turns: int = 1000,
+                          seed: Optional[int] = None, game_idx: int = 0, executor: Optional[Executor] = None,
+                          poll_executor: Optional[Executor] = None, rules: Optional[Rules] = None) -> GameResult:
+    # plays one game without blocking the event loop: the engine runs on a thread of executor, by
+    # default a pool of MAX_ENGINE_THREADS threads shared by all games, and only waits while one
+    # of its async agents is deciding. with a poll_executor the players in a challenge or block
+    # window decide concurrently. a logger must not be shared between games
+    loop = asyncio.get_running_loop()
+    bridged: List[Agent] = [AsyncAgentBridge(agent, loop) if isinstance(agent, AsyncAgent) else agent for agent in agents]
+    engine = partial(play_game, bridged, logger if logger is not None else NullLogger(), max_turns, seed, game_idx,
+                     poll_executor=poll_executor, rules=rules if rules is not None else DEFAULT_RULES)
+    return await loop.run_in_executor(executor if executor is not None else _default_engine_executor(), engine)
+
+async def play_games_async(make_agents: Callable[[int], Sequence[Union[Agent, AsyncAgent]]], num_games: int,
+                           max_concurrent_games: int = MAX_ENGINE_THREADS, max_turns: int = 1000, seed: Optional[int] = None,
+                           rules: Optional[Rules] = None) -> List[GameResult]:
+    # make_agents(game_idx) returns the seats of one game, agents must not be shared between
+    # games that run at the same time. a game's agents are only made once it gets an engine thread
+    slots = asyncio.Semaphore(max_concurrent_games)
+
+    async def play(executor: Executor, game_idx: int) -> GameResult:
+        async with slots:
+            return await play_game_async(make_agents(game_idx), None, max_turns, seed, game_idx, executor, rules=rules)
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrent_games, max(1, num_games))) as executor:
+        return list(await asyncio.gather(*[play(executor, game_idx) for game_idx in range(num_games)]))
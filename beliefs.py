@@ -0,0 +1,96 @@
+from utils import Action, Character, GameState, Rules, DEFAULT_RULES, CLAIMED_CHARACTERS
+from encoding import CHARACTER_INDEX, NUM_CHARACTERS
+from logger import NullLogger
+
+from typing import Dict, List, Optional, Sequence
+
+# public beliefs about every player's hidden cards, kept up to date from the logger callbacks.
+# each player has one weight per character that scales the chance that any one of its hidden
+# cards is that character. claims and blocks raise the weight of the characters backing them,
+# being caught bluffing zeroes it and shuffling cards back into the deck resets it. the prior is
+# the deck minus every card the observer can see, so queries take the observer's own hand.
+# the deck comes from the rules, which must be the ones of the game being tracked
+class BeliefTracker(NullLogger):
+    def __init__(self, rules: Rules = DEFAULT_RULES, claim_weight: float = 2.0) -> None:
+        super().__init__()
+        self._deck_size: int = len(rules.deck())
+        self._deck_counts: List[int] = [0] * NUM_CHARACTERS
+        for character in rules.deck():
+            self._deck_counts[CHARACTER_INDEX[character]] += 1
+        self._claim_weight: float = claim_weight
+
+        self._revealed: List[int] = [0] * NUM_CHARACTERS
+        self._num_hidden: Dict[str, int] = {}
+        self._weights: Dict[str, List[float]] = {}
+
+    def log_game_start(self, game_state: Optional[GameState]) -> None:
+        assert game_state is not None
+        if 2 * len(game_state.player_states) > self._deck_size:
+            raise ValueError(f"{len(game_state.player_states)} players do not fit the tracker's deck of {self._deck_size} cards, "
+                             "pass it the game's rules")
+
+        self._revealed = [0] * NUM_CHARACTERS
+        for character in game_state.revealed_characters:
+            self._revealed[CHARACTER_INDEX[character]] += 1
+        self._num_hidden = {name: 2 - len(player_state.revealed_characters) if player_state.in_game else 0
+                            for name, player_state in game_state.player_states.items()}
+        self._weights = {name: [1.0] * NUM_CHARACTERS for name in game_state.player_states}
+
+    def log_action(self, instigator: str, action: Action, target: Optional[str], game_state: Optional[GameState]) -> None:
+        self._claimed(instigator, action)
+
+    def log_block(self, instigator: str, blocker: str, action: Action, block_action: Action, game_state: Optional[GameState]) -> None:
+        self._claimed(blocker, block_action)
+
+    def log_challenge(self, instigator: str, challenger: str, action: Action, success: bool, game_state: Optional[GameState]) -> None:
+        # a failed challenge already reset the instigator through the exchange that follows it
+        if success:
+            weights: List[float] = self._weights[instigator]
+            for character in CLAIMED_CHARACTERS.get(action, ()):
+                weights[CHARACTER_INDEX[character]] = 0.0
+
+    def log_reveal(self, player_name: str, character: Character, game_state: Optional[GameState]) -> None:
+        self._revealed[CHARACTER_INDEX[character]] += 1
+        self._num_hidden[player_name] -= 1
+
+    def log_exchange(self, player_name: str, num_cards: int, game_state: Optional[GameState]) -> None:
+        self._weights[player_name] = [1.0] * NUM_CHARACTERS
+
+    def card_probabilities(self, player_name: str, observer_hidden: Sequence[Character]) -> List[float]:
+        # chance that one hidden card of player_name is each character, indexed like CHARACTERS
+        unseen: List[int] = [self._deck_counts[idx] - self._revealed[idx] for idx in range(NUM_CHARACTERS)]
+        for character in observer_hidden:
+            unseen[CHARACTER_INDEX[character]] -= 1
+
+        weights: List[float] = self._weights[player_name]
+        scores: List[float] = [max(0, unseen[idx]) * weights[idx] for idx in range(NUM_CHARACTERS)]
+        total: float = sum(scores)
+        if total == 0.0:
+            # the evidence contradicts the deck, fall back to the prior
+            scores = [float(max(0, count)) for count in unseen]
+            total = sum(scores)
+        if total == 0.0:
+            return [0.0] * NUM_CHARACTERS
+        return [score / total for score in scores]
+
+    def holds_probability(self, player_name: str, characters: Sequence[Character], observer_hidden: Sequence[Character]) -> float:
+        # chance that player_name holds at least one of characters
+        num_hidden: int = self._num_hidden.get(player_name, 0)
+        if num_hidden == 0:
+            return 0.0
+
+        card_probabilities: List[float] = self.card_probabilities(player_name, observer_hidden)
+        per_card: float = min(1.0, sum(card_probabilities[CHARACTER_INDEX[character]] for character in characters))
+        return 1.0 - (1.0 - per_card) ** num_hidden
+
+    def claim_probability(self, player_name: str, action: Action, observer_hidden: Sequence[Character]) -> float:
+        # chance that a claim of action by player_name is not a bluff, unchallengeable claims are always honest
+        characters = CLAIMED_CHARACTERS.get(action)
+        if characters is None:
+            return 1.0
+        return self.holds_probability(player_name, characters, observer_hidden)
+
+    def _claimed(self, player_name: str, action: Action) -> None:
+        weights: List[float] = self._weights[player_name]
+        for character in CLAIMED_CHARACTERS.get(action, ()):
+            weights[CHARACTER_INDEX[character]] *= self._claim_weight
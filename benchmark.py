@@ -0,0 +1,226 @@
+from utils import Action, Claim, GameState, derive_rng
+from agents import Agent
+from game import Game
+from player import Player
+from logger import NullLogger
+from profiler import Profiler
+from runner import AGENT_TYPES, play_game
+
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+TABLE_SIZES: List[int] = [2, 3, 4, 5, 6]
+TABLE_AGENTS: List[str] = ["RandomAgent", "RuleBasedAgent"]
+
+# metrics where a larger value is a regression, every other metric regresses when it drops
+LOWER_IS_BETTER: Tuple[str, ...] = ("ns_per_call", "bytes_per_game", "blocks_per_game")
+
+BenchmarkResults = Dict[str, Dict[str, Dict[str, float]]]
+
+class BlockCountLogger(NullLogger):
+    # samples the number of live allocated blocks at every claim, the most seen in a game stands in
+    # for its allocation count since cpython only counts allocations in debug builds
+    def __init__(self) -> None:
+        super().__init__()
+        self.peak_blocks: int = 0
+
+    def log_action(self, instigator: str, action: Action, target: Optional[str], game_state: Optional[GameState]) -> None:
+        self.peak_blocks = max(self.peak_blocks, sys.getallocatedblocks())
+
+def bench_table(agent_name: str, num_players: int, num_games: int, seed: int, repeat: int) -> Dict[str, float]:
+    # every pass plays the same seeded games, so the decision count of the profiled pass applies
+    # to the timed passes and the numbers are comparable between runs
+    logger = NullLogger()
+    agents: List[Agent] = [AGENT_TYPES[agent_name]() for _ in range(num_players)]
+
+    best: float = float("inf")
+    num_turns: int = 0
+    for _ in range(repeat):
+        num_turns = 0
+        start: float = time.perf_counter()
+        for game_idx in range(num_games):
+            num_turns += play_game(agents, logger, seed=seed, game_idx=game_idx).num_turns
+        best = min(best, time.perf_counter() - start)
+
+    profiler = Profiler()
+    for game_idx in range(num_games):
+        play_game(agents, logger, seed=seed, game_idx=game_idx, profiler=profiler)
+    num_decisions: int = sum(stats.calls for phase, stats in profiler.stats().items() if phase.startswith("agent:"))
+
+    # blocks are counted without tracemalloc, whose own bookkeeping allocates blocks
+    gc.collect()
+    block_logger = BlockCountLogger()
+    peak_blocks_total: int = 0
+    baseline_blocks: int = sys.getallocatedblocks()
+    for game_idx in range(num_games):
+        start_blocks: int = sys.getallocatedblocks()
+        block_logger.peak_blocks = start_blocks
+        play_game(agents, block_logger, seed=seed, game_idx=game_idx)
+        peak_blocks_total += block_logger.peak_blocks - start_blocks
+    gc.collect()
+    retained_blocks: int = sys.getallocatedblocks() - baseline_blocks
+
+    # bytes still held after the games stand in for leaks
+    gc.collect()
+    tracemalloc.start()
+    peak_total: int = 0
+    baseline_bytes: int = tracemalloc.get_traced_memory()[0]
+    for game_idx in range(num_games):
+        tracemalloc.reset_peak()
+        current_bytes: int = tracemalloc.get_traced_memory()[0]
+        play_game(agents, logger, seed=seed, game_idx=game_idx)
+        peak_total += tracemalloc.get_traced_memory()[1] - current_bytes
+    gc.collect()
+    retained_bytes: int = tracemalloc.get_traced_memory()[0] - baseline_bytes
+    tracemalloc.stop()
+
+    for agent in agents:
+        agent.close()
+
+    return {
+        "games_per_sec": num_games / best,
+        "turns_per_sec": num_turns / best,
+        "decisions_per_sec": num_decisions / best,
+        "peak_bytes_per_game": peak_total / num_games,
+        "retained_bytes_per_game": max(0, retained_bytes) / num_games,
+        "peak_blocks_per_game": peak_blocks_total / num_games,
+        "retained_blocks_per_game": max(0, retained_blocks) / num_games,
+    }
+
+def _midgame(seed: int, num_players: int = 4, num_turns: int = 4) -> Tuple[Game, Dict[str, Agent]]:
+    # the first seeded game that still has every player after num_turns turns
+    logger = NullLogger()
+    game_idx: int = 0
+    while True:
+        agents: Dict[str, Agent] = {f"seat_{seat}": AGENT_TYPES["RandomAgent"](derive_rng(seed, game_idx, seat + 1), trajectory_capacity=0)
+                                    for seat in range(num_players)}
+        game = Game(derive_rng(seed, game_idx))
+        game.enter_players(*[Player(name, agent) for name, agent in agents.items()])
+        game.initialise_game()
+
+        for _ in range(num_turns):
+            game.handle_action(logger)
+            game.goto_next_player()
+        if game.get_players_left() == num_players:
+            return game, agents
+        game_idx += 1
+
+def _time_call(func: Callable[[], object], repeat: int, number: int) -> float:
+    best: float = float("inf")
+    for _ in range(repeat):
+        start: int = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter_ns() - start) / number)
+    return best
+
+def bench_micro(seed: int, repeat: int, number: int) -> Dict[str, Dict[str, float]]:
+    game, agents = _midgame(seed)
+    logger = NullLogger()
+    names: List[str] = list(game.get_state().turn_order)
+    instigator, challenger = names[0], names[1]
+    claim = Claim(Action.TAX)
+
+    timings: Dict[str, Callable[[], object]] = {
+        "get_state": game.get_state,
+        "_get_player_perspective": lambda: game._get_player_perspective(challenger),
+        "_update_game_state": game._update_game_state,
+        "clone": lambda: game.clone(agents),
+    }
+    results: Dict[str, Dict[str, float]] = {name: {"ns_per_call": _time_call(func, repeat, number)} for name, func in timings.items()}
+
+    # resolving a challenge changes the game, so every call runs on a fresh clone that is made outside the timer
+    best: float = float("inf")
+    for _ in range(repeat):
+        elapsed: int = 0
+        for _ in range(number):
+            clone: Game = game.clone(agents)
+            start: int = time.perf_counter_ns()
+            clone._handle_challenge(instigator, challenger, claim, logger)
+            elapsed += time.perf_counter_ns() - start
+        best = min(best, elapsed / number)
+    results["_handle_challenge"] = {"ns_per_call": best}
+    return results
+
+def run_benchmarks(num_games: int = 200, seed: int = 0, repeat: int = 3, micro_number: int = 2000) -> Dict[str, object]:
+    tables: BenchmarkResults = {"tables": {}, "micro": {}}
+    for agent_name in TABLE_AGENTS:
+        for num_players in TABLE_SIZES:
+            tables["tables"][f"{agent_name}x{num_players}"] = bench_table(agent_name, num_players, num_games, seed, repeat)
+    tables["micro"] = bench_micro(seed, repeat, micro_number)
+
+    return {
+        "config": {"games": num_games, "seed": seed, "repeat": repeat, "micro_number": micro_number},
+        "machine": {"python": sys.version.split()[0], "implementation": platform.python_implementation(),
+                    "platform": platform.platform(), "processor": platform.processor()},
+        **tables,
+    }
+
+def compare(results: Dict[str, object], baseline: Dict[str, object], tolerance: float) -> List[str]:
+    # returns one line per metric that is worse than the baseline by more than the tolerance
+    regressions: List[str] = []
+    for section in ("tables", "micro"):
+        current: Dict[str, Dict[str, float]] = results[section]  # type: ignore[assignment]
+        previous: Dict[str, Dict[str, float]] = baseline.get(section, {})  # type: ignore[union-attr]
+        for name, metrics in current.items():
+            for metric, value in metrics.items():
+                base: Optional[float] = previous.get(name, {}).get(metric)
+                if not base:
+                    continue
+
+                change: float = (value - base) / base
+                if metric.endswith(LOWER_IS_BETTER):
+                    change = -change
+                if change < -tolerance:
+                    regressions.append(f"{section}/{name}/{metric}: {base:.1f} -> {value:.1f} ({change:+.1%})")
+    return regressions
+
+def format_results(results: Dict[str, object]) -> str:
+    lines: List[str] = [f"{'table':<18} {'games/s':>10} {'turns/s':>10} {'decisions/s':>12} {'peak KiB':>10} {'retained B':>11} "
+                        f"{'peak blocks':>12} {'kept blocks':>12}"]
+    for name, metrics in results["tables"].items():  # type: ignore[union-attr]
+        lines.append(f"{name:<18} {metrics['games_per_sec']:>10.1f} {metrics['turns_per_sec']:>10.1f} "
+                     f"{metrics['decisions_per_sec']:>12.1f} {metrics['peak_bytes_per_game'] / 1024:>10.1f} "
+                     f"{metrics['retained_bytes_per_game']:>11.1f} {metrics['peak_blocks_per_game']:>12.1f} "
+                     f"{metrics['retained_blocks_per_game']:>12.1f}")
+    lines.append(f"{'micro path':<26} {'ns/call':>10}")
+    for name, metrics in results["micro"].items():  # type: ignore[union-attr]
+        lines.append(f"{name:<26} {metrics['ns_per_call']:>10.0f}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark engine and agent throughput and compare against a baseline")
+    parser.add_argument("--games", type=int, default=200, help="games per table")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes, the fastest is kept")
+    parser.add_argument("--micro-number", type=int, default=2000, help="calls per micro benchmark pass")
+    parser.add_argument("--output", default=None, help="write the results as json to this path")
+    parser.add_argument("--baseline", default=None, help="json results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative slowdown before failing")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.games, args.seed, args.repeat, args.micro_number)
+    print(format_results(results))
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("config") != results["config"]:
+            print(f"Warning: the baseline was run with {baseline.get('config')}")
+
+        regressions: List[str] = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}")
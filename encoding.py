@@ -0,0 +1,124 @@
+from utils import Character, GameState, PlayerState, PlayerPerspective
+
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+
+CHARACTERS: List[Character] = list(Character)
+CHARACTER_INDEX: Dict[Character, int] = {character: idx for idx, character in enumerate(CHARACTERS)}
+NUM_CHARACTERS: int = len(CHARACTERS)
+
+OBSERVATION_DTYPE = np.int16
+
+# header layout
+CURRENT_ROW: int = 0
+NUM_ALIVE: int = 1
+HIDDEN: int = 2
+HEADER_WIDTH: int = HIDDEN + NUM_CHARACTERS
+
+# per seat layout, rows are rotated so the observing player is always row 0
+PRESENT: int = 0
+IN_GAME: int = 1
+TURN_POSITION: int = 2
+COINS: int = 3
+REVEALED: int = 4
+SEAT_WIDTH: int = REVEALED + NUM_CHARACTERS
+
+# packs a PlayerPerspective into a fixed width vector and back, seats past the
+# table size are zero padding so tables of different sizes share the same width
+class PerspectiveEncoder:
+    def __init__(self, names: Sequence[str], max_players: int = 6) -> None:
+        if len(names) > max_players:
+            raise ValueError(f"{len(names)} players do not fit in an encoding for {max_players}")
+
+        self._names: List[str] = list(names)
+        self._seats: Dict[str, int] = {name: seat for seat, name in enumerate(self._names)}
+        self._max_players: int = max_players
+        self._width: int = HEADER_WIDTH + max_players * SEAT_WIDTH
+
+    @property
+    def names(self) -> List[str]:
+        return self._names
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    def seat(self, name: str) -> int:
+        return self._seats[name]
+
+    def encode(self, player_perspective: PlayerPerspective) -> np.ndarray:
+        observation = np.zeros(self._width, dtype=OBSERVATION_DTYPE)
+        self.encode_into(player_perspective, observation)
+        return observation
+
+    def encode_batch(self, player_perspectives: Sequence[PlayerPerspective]) -> np.ndarray:
+        observations = np.zeros((len(player_perspectives), self._width), dtype=OBSERVATION_DTYPE)
+        for row, player_perspective in enumerate(player_perspectives):
+            self.encode_into(player_perspective, observations[row])
+        return observations
+
+    def encode_into(self, player_perspective: PlayerPerspective, out: np.ndarray) -> None:
+        # out is expected to be zeroed, only non-zero fields are written
+        game_state: GameState = player_perspective.game_state
+        num_seats: int = len(self._names)
+        own_seat: int = self._seats[player_perspective.name]
+
+        current_row: int = -1
+        if game_state.current_player:
+            current_row = (self._seats[game_state.current_player] - own_seat) % num_seats
+        out[CURRENT_ROW] = current_row
+        out[NUM_ALIVE] = game_state.num_players_alive
+        for character in player_perspective.hidden_characters:
+            out[HIDDEN + CHARACTER_INDEX[character]] += 1
+
+        seats = out[HEADER_WIDTH:].reshape(self._max_players, SEAT_WIDTH)
+        seats[:num_seats, PRESENT] = 1
+        seats[:num_seats, TURN_POSITION] = -1
+        for position, name in enumerate(game_state.turn_order):
+            seats[(self._seats[name] - own_seat) % num_seats, TURN_POSITION] = position
+
+        for name, player_state in game_state.player_states.items():
+            row = seats[(self._seats[name] - own_seat) % num_seats]
+            row[IN_GAME] = player_state.in_game
+            row[COINS] = player_state.coins
+            for character in player_state.revealed_characters:
+                row[REVEALED + CHARACTER_INDEX[character]] += 1
+
+    def decode(self, observation: np.ndarray, name: str) -> PlayerPerspective:
+        # card order within a hand or a revealed pile is not encoded, characters come back in enum order
+        num_seats: int = len(self._names)
+        own_seat: int = self._seats[name]
+        seats = observation[HEADER_WIDTH:].reshape(self._max_players, SEAT_WIDTH)
+
+        turn_positions: List[Tuple[int, str]] = []
+        player_states: Dict[str, PlayerState] = {}
+        revealed_characters: List[Character] = []
+        for seat_name in self._names:
+            row = seats[(self._seats[seat_name] - own_seat) % num_seats]
+            revealed: List[Character] = _counts_to_characters(row[REVEALED:REVEALED + NUM_CHARACTERS])
+            revealed_characters.extend(revealed)
+            player_states[seat_name] = PlayerState(coins=int(row[COINS]),
+                                                   revealed_characters=tuple(revealed),
+                                                   in_game=bool(row[IN_GAME]))
+            if row[TURN_POSITION] >= 0:
+                turn_positions.append((int(row[TURN_POSITION]), seat_name))
+
+        current_player: str = ""
+        current_row: int = int(observation[CURRENT_ROW])
+        if current_row >= 0:
+            current_player = self._names[(own_seat + current_row) % num_seats]
+
+        game_state = GameState(current_player=current_player,
+                               num_players_alive=int(observation[NUM_ALIVE]),
+                               turn_order=tuple(seat_name for _, seat_name in sorted(turn_positions)),
+                               player_states=player_states,
+                               revealed_characters=tuple(revealed_characters))
+
+        hidden_characters = _counts_to_characters(observation[HIDDEN:HIDDEN + NUM_CHARACTERS])
+        return PlayerPerspective(game_state, name, tuple(hidden_characters))
+
+def _counts_to_characters(counts: np.ndarray) -> List[Character]:
+    characters: List[Character] = []
+    for idx, count in enumerate(counts):
+        characters.extend([CHARACTERS[idx]] * int(count))
+    return characters
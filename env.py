@@ -0,0 +1,317 @@
+from utils import Action, Claim, Character, PlayerPerspective, Rules, DEFAULT_RULES
+from actions import ActionTable, NO_RESPONSE
+from agents import Agent
+from encoding import CHARACTERS, CHARACTER_INDEX, NUM_CHARACTERS, OBSERVATION_DTYPE, PerspectiveEncoder
+from logger import NullLogger
+from runner import GameResult, play_game
+
+from abc import abstractmethod
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import multiprocessing
+import queue
+import random
+import threading
+import numpy as np
+
+# decision kinds of the controlled seat
+ACTION: int = 0
+CHALLENGE: int = 1
+BLOCK: int = 2
+REVEAL: int = 3
+EXCHANGE: int = 4
+
+# the observation is the encoded perspective followed by what is being decided
+DECISION_KIND: int = 0
+CLAIM_ID: int = 1        # table id of the claim being challenged or blocked, -1 otherwise
+INSTIGATOR_ROW: int = 2  # row of the claim's instigator relative to the observer, -1 otherwise
+CARDS_LEFT: int = 3      # cards still to be put back during an exchange
+CONTEXT_WIDTH: int = 4
+
+class EpisodeAborted(Exception):
+    pass
+
+class Decision:
+    __slots__ = ("observation", "legal_mask")
+
+    def __init__(self, observation: np.ndarray, legal_mask: np.ndarray) -> None:
+        self.observation: np.ndarray = observation
+        self.legal_mask: np.ndarray = legal_mask
+
+def decision_spaces(num_players: int, rules: Rules = DEFAULT_RULES) -> Tuple[int, int]:
+    # the number of action ids and the observation width of a DecisionAgent at a table of num_players
+    num_actions: int = ActionTable([f"seat_{seat}" for seat in range(num_players)], rules).num_actions + 1 + NUM_CHARACTERS
+    return num_actions, PerspectiveEncoder([], rules.max_players).width + CONTEXT_WIDTH
+
+class DecisionAgent(Agent):
+    # encodes every decision as an observation and a legal mask over one flat action space and
+    # leaves the choice of an id to _answer. ids past the action table are a challenge and one id
+    # per character, used both to reveal a card and to pick the cards put back after an exchange
+    def __init__(self, rng: Optional[random.Random] = None, trajectory_capacity: int = 0) -> None:
+        super().__init__(rng, trajectory_capacity)
+        self._action_table: Optional[ActionTable] = None
+        self._encoder: Optional[PerspectiveEncoder] = None
+
+    @property
+    def challenge_id(self) -> int:
+        assert self._action_table is not None
+        return self._action_table.num_actions
+
+    def character_id(self, character: Character) -> int:
+        return self.challenge_id + 1 + CHARACTER_INDEX[character]
+
+    def bind(self, action_table: ActionTable, encoder: PerspectiveEncoder) -> None:
+        super().bind(action_table, encoder)
+        self._action_table = action_table
+        self._encoder = encoder
+
+    def choose_to_challenge(self, instigator: str, claim: Claim, player_perspective: Optional[PlayerPerspective]) -> bool:
+        assert self._action_table is not None
+        legal_ids: List[int] = [self._action_table.claim_id(NO_RESPONSE), self.challenge_id]
+        return self._decide(player_perspective, CHALLENGE, legal_ids, claim, instigator) == self.challenge_id
+
+    def choose_to_block(self, legal_responses: Sequence[Claim], action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Claim]:
+        assert self._action_table is not None and player_perspective is not None
+        blocked = Claim(action, player_perspective.name if action != Action.FOREIGN_AID else None)
+        instigator: Optional[str] = next((claim.target for claim in legal_responses if claim.target is not None), None)
+        legal_ids: List[int] = [self._action_table.claim_id(claim) for claim in legal_responses]
+        return self._action_table.claim(self._decide(player_perspective, BLOCK, legal_ids, blocked, instigator))
+
+    def choose_action(self, legal_claims: Sequence[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
+        assert self._action_table is not None
+        legal_ids: List[int] = [self._action_table.claim_id(claim) for claim in legal_claims]
+        return self._action_table.claim(self._decide(player_perspective, ACTION, legal_ids))
+
+    def choose_character(self, characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> Character:
+        legal_ids: List[int] = [self.character_id(character) for character in characters]
+        return CHARACTERS[self._decide(player_perspective, REVEAL, legal_ids) - self.challenge_id - 1]
+
+    def exchange_cards(self, num_cards_to_exchange: int, available_characters: List[Character], player_perspective: Optional[PlayerPerspective]) -> List[Character]:
+        # one decision per card put back
+        available: List[Character] = available_characters.copy()
+        chosen: List[Character] = []
+        for cards_left in range(num_cards_to_exchange, 0, -1):
+            legal_ids: List[int] = [self.character_id(character) for character in available]
+            character: Character = CHARACTERS[self._decide(player_perspective, EXCHANGE, legal_ids, cards_left=cards_left) - self.challenge_id - 1]
+            available.remove(character)
+            chosen.append(character)
+        return chosen
+
+    def _decide(self, player_perspective: Optional[PlayerPerspective], kind: int, legal_ids: Sequence[int],
+                claim: Optional[Claim] = None, instigator: Optional[str] = None, cards_left: int = 0) -> int:
+        assert self._action_table is not None and self._encoder is not None and player_perspective is not None
+
+        observation = np.zeros(self._encoder.width + CONTEXT_WIDTH, dtype=OBSERVATION_DTYPE)
+        self._encoder.encode_into(player_perspective, observation[:self._encoder.width])
+        context = observation[self._encoder.width:]
+        context[DECISION_KIND] = kind
+        context[CLAIM_ID] = self._action_table.claim_id(claim) if claim is not None else -1
+        context[INSTIGATOR_ROW] = -1
+        if instigator is not None:
+            num_seats: int = len(self._encoder.names)
+            context[INSTIGATOR_ROW] = (self._encoder.seat(instigator) - self._encoder.seat(player_perspective.name)) % num_seats
+        context[CARDS_LEFT] = cards_left
+
+        legal_mask = np.zeros(self.challenge_id + 1 + NUM_CHARACTERS, dtype=bool)
+        legal_mask[list(legal_ids)] = True
+        return self._answer(Decision(observation, legal_mask))
+
+    @abstractmethod
+    def _answer(self, decision: Decision) -> int:
+        pass
+
+class EnvAgent(DecisionAgent):
+    # stands in for the env's controlled seat, the game thread waits for env.step to answer
+    def __init__(self) -> None:
+        super().__init__()
+        self._requests: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._answers: "queue.SimpleQueue[Optional[int]]" = queue.SimpleQueue()
+        self._reward: float = 0.0
+
+    def propogate_reward(self, reward: float) -> None:
+        super().propogate_reward(reward)
+        self._reward += reward
+
+    def take_reward(self) -> float:
+        reward: float = self._reward
+        self._reward = 0.0
+        return reward
+
+    def _answer(self, decision: Decision) -> int:
+        self._requests.put(decision)
+        answer: Optional[int] = self._answers.get()
+        if answer is None:
+            raise EpisodeAborted()
+        return answer
+
+class CoupEnv:
+    # gym style environment for one seat, the other seats are played by the given agents.
+    # the engine runs on a thread that pauses at every decision of the controlled seat, rewards
+    # are the engine's shaped reward components, including the win bonus, summed between decisions
+    def __init__(self, opponents: Sequence[Agent], seed: Optional[int] = None, max_turns: int = 1000,
+                 rules: Rules = DEFAULT_RULES) -> None:
+        self._agent: EnvAgent = EnvAgent()
+        self._opponents: List[Agent] = list(opponents)
+        self._seed: Optional[int] = seed
+        self._max_turns: int = max_turns
+        self._rules: Rules = rules
+        self._episode: int = 0
+        self._thread: Optional[threading.Thread] = None
+        self._decision: Optional[Decision] = None
+
+        self._num_actions, self._observation_size = decision_spaces(len(self._opponents) + 1, rules)
+
+    @property
+    def num_actions(self) -> int:
+        return self._num_actions
+
+    @property
+    def observation_size(self) -> int:
+        return self._observation_size
+
+    def reset(self, seed: Optional[int] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        # episode i of a seeded env replays play_game(..., seed, game_idx=i)
+        self._abort()
+        if seed is not None:
+            self._seed = seed
+            self._episode = 0
+
+        agents: List[Agent] = [self._agent] + self._opponents
+        game_idx: int = self._episode
+        self._episode += 1
+        self._agent.take_reward()
+        self._thread = threading.Thread(target=self._play, args=(agents, game_idx), daemon=True)
+        self._thread.start()
+
+        item = self._agent._requests.get()
+        if not isinstance(item, Decision):
+            # the game finished before the seat had to decide anything
+            return self._finish(item)[0], {"action_mask": np.zeros(self._num_actions, dtype=bool)}
+        self._decision = item
+        return item.observation, {"action_mask": item.legal_mask}
+
+    def step(self, action_id: int) -> Tuple[np.ndarray, float, bool, bool, Dict[str, Any]]:
+        if self._decision is None:
+            raise RuntimeError("reset must be called before step")
+        if not 0 <= action_id < self._num_actions or not self._decision.legal_mask[action_id]:
+            raise ValueError(f"{action_id} is not a legal action")
+
+        self._decision = None
+        self._agent._answers.put(int(action_id))
+        item = self._agent._requests.get()
+        if isinstance(item, Decision):
+            self._decision = item
+            return item.observation, self._agent.take_reward(), False, False, {"action_mask": item.legal_mask}
+
+        observation, info = self._finish(item)
+        terminated: bool = isinstance(item, GameResult) and item.winner_seat is not None
+        return observation, self._agent.take_reward(), terminated, not terminated, info
+
+    def close(self) -> None:
+        self._abort()
+        for agent in self._opponents:
+            agent.close()
+
+    def _play(self, agents: List[Agent], game_idx: int) -> None:
+        try:
+            # streamed, so every step returns the reward of the decisions since the last one
+            result: Any = play_game(agents, NullLogger(), self._max_turns, self._seed, game_idx, rules=self._rules,
+                                    stream_rewards=True)
+        except EpisodeAborted:
+            return
+        except Exception as error:
+            result = error
+        self._agent._requests.put(result)
+
+    def _finish(self, item: Any) -> Tuple[np.ndarray, Dict[str, Any]]:
+        self._thread = None
+        if isinstance(item, Exception):
+            raise item
+        return (np.zeros(self._observation_size, dtype=OBSERVATION_DTYPE),
+                {"action_mask": np.zeros(self._num_actions, dtype=bool), "result": item})
+
+    def _abort(self) -> None:
+        if self._thread is not None:
+            self._agent._answers.put(None)
+            self._thread.join()
+            self._thread = None
+        self._decision = None
+
+EnvFactory = Callable[[], CoupEnv]
+
+def _env_worker(connection: Connection, make_env: EnvFactory) -> None:
+    env: CoupEnv = make_env()
+    try:
+        while True:
+            command, data = connection.recv()
+            if command == "step":
+                observation, reward, terminated, truncated, info = env.step(data)
+                if terminated or truncated:
+                    # autoreset, the finished game's result stays in the info
+                    observation, reset_info = env.reset()
+                    info = {**reset_info, "final_info": info}
+                connection.send((observation, info["action_mask"], reward, terminated, truncated, info))
+            elif command == "reset":
+                observation, info = env.reset(data)
+                connection.send((observation, info["action_mask"]))
+            elif command == "spaces":
+                connection.send((env.num_actions, env.observation_size))
+            elif command == "close":
+                break
+    finally:
+        env.close()
+        connection.close()
+
+class SubprocVectorEnv:
+    # runs one CoupEnv per process and steps them in lockstep. finished episodes are reset
+    # automatically, so the returned observation then belongs to the next episode
+    def __init__(self, env_fns: Sequence[EnvFactory], context: Optional[str] = None) -> None:
+        ctx = multiprocessing.get_context(context)
+        self._connections: List[Connection] = []
+        self._processes = []
+        for make_env in env_fns:
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_env_worker, args=(child, make_env), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+        self._connections[0].send(("spaces", None))
+        self.num_actions, self.observation_size = self._connections[0].recv()
+
+    @property
+    def num_envs(self) -> int:
+        return len(self._connections)
+
+    def reset(self, seeds: Optional[Sequence[Optional[int]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        for env_idx, connection in enumerate(self._connections):
+            connection.send(("reset", seeds[env_idx] if seeds is not None else None))
+        results = [connection.recv() for connection in self._connections]
+        return np.stack([result[0] for result in results]), np.stack([result[1] for result in results])
+
+    def step_async(self, actions: Sequence[int]) -> None:
+        for connection, action in zip(self._connections, actions):
+            connection.send(("step", int(action)))
+
+    def step_wait(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        # observations, action masks, rewards, terminated, truncated, infos
+        results = [connection.recv() for connection in self._connections]
+        return (np.stack([result[0] for result in results]),
+                np.stack([result[1] for result in results]),
+                np.array([result[2] for result in results], dtype=np.float32),
+                np.array([result[3] for result in results], dtype=bool),
+                np.array([result[4] for result in results], dtype=bool),
+                [result[5] for result in results])
+
+    def step(self, actions: Sequence[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self) -> None:
+        for connection in self._connections:
+            connection.send(("close", None))
+        for process in self._processes:
+            process.join()
+        for connection in self._connections:
+            connection.close()
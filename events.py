@@ -0,0 +1,189 @@
+from utils import Action, Character, GameState, PlayerState, Rules, DEFAULT_RULES
+from game import Game
+from logger import Logger
+
+from dataclasses import dataclass, replace
+from functools import reduce
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+@dataclass(frozen=True)
+class GameStarted:
+    game_state: GameState
+
+@dataclass(frozen=True)
+class TurnStarted:
+    player: str
+    turn_order: Tuple[str, ...]
+
+@dataclass(frozen=True)
+class ActionClaimed:
+    player: str
+    action: Action
+    target: Optional[str]
+
+@dataclass(frozen=True)
+class ChallengeDeclined:
+    player: str
+    instigator: str
+    action: Action
+
+@dataclass(frozen=True)
+class Challenged:
+    # success means the instigator was lying
+    challenger: str
+    instigator: str
+    action: Action
+    success: bool
+
+@dataclass(frozen=True)
+class Blocked:
+    blocker: str
+    instigator: str
+    action: Action
+    block_action: Action
+
+@dataclass(frozen=True)
+class InfluenceLost:
+    player: str
+    character: Character
+
+@dataclass(frozen=True)
+class CardsExchanged:
+    player: str
+    num_cards: int
+
+@dataclass(frozen=True)
+class CoinsMoved:
+    # amount goes to player, from source or from the bank when source is None
+    player: str
+    amount: int
+    source: Optional[str] = None
+
+@dataclass(frozen=True)
+class ActionResolved:
+    player: str
+    action: Action
+    target: Optional[str]
+
+@dataclass(frozen=True)
+class GameOver:
+    winner: str
+
+Event = Union[GameStarted, TurnStarted, ActionClaimed, ChallengeDeclined, Challenged, Blocked,
+              InfluenceLost, CardsExchanged, CoinsMoved, ActionResolved, GameOver]
+
+class EventLogger(Logger):
+    # turns the logger callbacks of a turn into events, drained by game_events after every turn
+    def __init__(self, rules: Rules = DEFAULT_RULES) -> None:
+        super().__init__()
+        self._rules: Rules = rules
+        self._events: List[Event] = []
+        self._claim: Optional[ActionClaimed] = None
+        self._blocked: bool = False
+        self._resolved: bool = False
+
+    def drain(self) -> List[Event]:
+        # a blocked assassination still costs the assassin, the engine takes the coins without
+        # a resolution so the payment is added once the turn is over
+        if self._claim is not None and self._claim.action == Action.ASSASSINATE and self._blocked and not self._resolved:
+            self._events.append(CoinsMoved(self._claim.player, -self._rules.assassination_cost))
+
+        events: List[Event] = self._events
+        self._events = []
+        self._claim = None
+        self._blocked = False
+        self._resolved = False
+        return events
+
+    def log_game_start(self, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_turn_start(self, player_name: str, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_action(self, instigator: str, action: Action, target: Optional[str], game_state: Optional[GameState]) -> None:
+        self._claim = ActionClaimed(instigator, action, target)
+        self._events.append(self._claim)
+
+    def log_challenge(self, instigator: str, challenger: str, action: Action, success: bool, game_state: Optional[GameState]) -> None:
+        self._events.append(Challenged(challenger, instigator, action, success))
+
+    def log_no_challenge(self, instigator: str, allower: str, action: Action, game_state: Optional[GameState]) -> None:
+        self._events.append(ChallengeDeclined(allower, instigator, action))
+
+    def log_block(self, instigator: str, blocker: str, action: Action, block_action: Action, game_state: Optional[GameState]) -> None:
+        self._blocked = True
+        self._events.append(Blocked(blocker, instigator, action, block_action))
+
+    def log_resolution(self, instigator: str, action: Action, target: Optional[str], coins: int, game_state: Optional[GameState]) -> None:
+        self._resolved = True
+        if coins != 0:
+            self._events.append(CoinsMoved(instigator, coins, target if action == Action.STEAL else None))
+        self._events.append(ActionResolved(instigator, action, target))
+
+    def log_reveal(self, player_name: str, character: Character, game_state: Optional[GameState]) -> None:
+        self._events.append(InfluenceLost(player_name, character))
+
+    def log_exchange(self, player_name: str, num_cards: int, game_state: Optional[GameState]) -> None:
+        self._events.append(CardsExchanged(player_name, num_cards))
+
+    def log_game_state(self, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_winner(self, winner: str) -> None:
+        self._events.append(GameOver(winner))
+
+def game_events(game: Game, max_turns: int = 1000) -> Iterator[Event]:
+    # plays an initialised game and yields its events, the turn loop is the one of runner.play_game
+    logger = EventLogger(game.get_rules())
+    yield GameStarted(game.get_state())
+
+    num_turns: int = 0
+    while game.game_is_active() and num_turns < max_turns:
+        game_state: GameState = game.get_state()
+        yield TurnStarted(game_state.current_player, game_state.turn_order)
+        game.handle_action(logger)
+        yield from logger.drain()
+        game.goto_next_player()
+        num_turns += 1
+
+        if game.get_players_left() <= 1:
+            game.declare_winner(logger)
+            yield from logger.drain()
+            break
+    # after the winner, or when the game was cut short at max_turns
+    game.deliver_rewards()
+
+def fold_event(game_state: GameState, event: Event) -> GameState:
+    # the public state after event, folding a game's events gives the engine's state at the
+    # start of every turn
+    if isinstance(event, GameStarted):
+        return event.game_state
+
+    if isinstance(event, TurnStarted):
+        return replace(game_state, current_player=event.player, num_players_alive=len(event.turn_order),
+                       turn_order=event.turn_order)
+
+    if isinstance(event, CoinsMoved):
+        player_states: Dict[str, PlayerState] = dict(game_state.player_states)
+        player_state: PlayerState = player_states[event.player]
+        player_states[event.player] = replace(player_state, coins=player_state.coins + event.amount)
+        if event.source is not None:
+            source_state: PlayerState = player_states[event.source]
+            player_states[event.source] = replace(source_state, coins=source_state.coins - event.amount)
+        return replace(game_state, player_states=player_states)
+
+    if isinstance(event, InfluenceLost):
+        player_states = dict(game_state.player_states)
+        player_state = player_states[event.player]
+        revealed_characters: Tuple[Character, ...] = player_state.revealed_characters + (event.character,)
+        player_states[event.player] = PlayerState(coins=player_state.coins, revealed_characters=revealed_characters,
+                                                  in_game=len(revealed_characters) < 2)
+        return replace(game_state, player_states=player_states,
+                       revealed_characters=tuple(character for state in player_states.values()
+                                                 for character in state.revealed_characters))
+
+    return game_state
+
+def fold_events(events: Iterable[Event], game_state: Optional[GameState] = None) -> GameState:
+    return reduce(fold_event, events, game_state if game_state is not None else GameState())
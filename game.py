@@ -1,58 +1,165 @@
 from player import Player
-from utils import Action, Claim, Block, GameState, Character, PlayerState, PlayerPerspective
+from agents import Agent
+from utils import Action, Claim, Block, GameState, Character, PlayerState, PlayerPerspective, Rules, DEFAULT_RULES, CLAIMED_CHARACTERS
 from logger import Logger
+from rewards import DEFAULT_SHAPING, RewardLedger, RewardShaping
+from actions import ActionTable
+from encoding import PerspectiveEncoder
 
-from typing import List, Optional
+from concurrent.futures import Executor, wait
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
 import random
-import copy
 
-class Game:
-    def __init__(self) -> None:
-        self._deck: List[Character] = [Character.CONTESSA, Character.CONTESSA, Character.CONTESSA,
-                                       Character.ASSASSIN, Character.ASSASSIN, Character.ASSASSIN,
-                                       Character.AMBASSADOR, Character.AMBASSADOR, Character.AMBASSADOR,
-                                       Character.CAPTAIN, Character.CAPTAIN, Character.CAPTAIN,
-                                       Character.DUKE, Character.DUKE, Character.DUKE]
+NO_SEAT: int = -1
+
+# the seats still in the rotation, in turn order, as seat indices and as names
+SeatView = Tuple[Tuple[int, ...], Tuple[str, ...]]
 
+class Game:
+    def __init__(self, rng: Optional[random.Random] = None, rules: Rules = DEFAULT_RULES,
+                 shaping: RewardShaping = DEFAULT_SHAPING, reward_ledger: Optional[RewardLedger] = None,
+                 stream_rewards: bool = False, record_rewards: bool = True) -> None:
+        # every game owns its random stream so it can be replayed from a seed, see derive_rng
+        self._rng: random.Random = rng if rng is not None else random.Random()
+        self._rules: Rules = rules
+        # reward components are recorded in the ledger, which is only allocated on the first reward.
+        # by default every agent gets its total once from deliver_rewards, streamed rewards reach
+        # the agents as they happen instead, for learners that credit every decision. games that
+        # never read their rewards, like search playouts, turn recording off and reward nobody
+        self._shaping: RewardShaping = shaping
+        self._record_rewards: bool = record_rewards
+        self._reward_ledger: Optional[RewardLedger] = reward_ledger
+        self._stream_rewards: bool = stream_rewards
+        self._rewards_delivered: bool = False
+        self._turn: int = 0
+        self._deck: List[Character] = list(rules.deck())
+
+        # players keep their seat for the whole game. eliminated players stay in the rotation until
+        # goto_next_player reaches them, so alive means still in the rotation
         self._players: List[Player] = []
-        self._current_player_idx: int
+        self._seats: Dict[str, int] = {}
+        self._alive: int = 0
+        self._num_alive: int = 0
+        self._next_seat: List[int] = []
+        self._prev_seat: List[int] = []
+        self._current_seat: int = NO_SEAT
+        self._seat_views: Dict[Tuple[int, int], SeatView] = {}
+        # the last perspective built for every seat, reused while the snapshot and the hand are the same
+        self._perspectives: List[Optional[PlayerPerspective]] = []
+        # seats whose coins or cards changed since the last snapshot
+        self._dirty_seats: int = 0
         self._game_active: bool = False
         self._winner: Optional[Player] = None
-        self._game_state: Optional[GameState] = GameState()
+        self._game_state: GameState = GameState()
+        self._action_table: Optional[ActionTable] = None
+        self._encoder: Optional[PerspectiveEncoder] = None
+        # when set, challenges and blocks are polled from every eligible player at once
+        self._poll_executor: Optional[Executor] = None
+
+    def clone(self, agents: Mapping[str, Agent], rng: Optional[random.Random] = None, record_rewards: bool = True) -> "Game":
+        # cheap copy for forward search: the deck, hands, coins and turn are copied, snapshots and
+        # tables are shared and every player gets the agent registered under its name in agents.
+        # without rng the copy continues the random stream of this game
+        game: Game = Game.__new__(Game)
+        if rng is None:
+            rng = random.Random()
+            rng.setstate(self._rng.getstate())
+        game._rng = rng
+        game._rules = self._rules
+        game._shaping = self._shaping
+        game._record_rewards = record_rewards
+        game._reward_ledger = None
+        game._stream_rewards = self._stream_rewards
+        game._rewards_delivered = False
+        game._turn = self._turn
+        game._deck = self._deck.copy()
+        game._players = [player.clone(agents[player.name]) for player in self._players]
+        game._seats = self._seats
+        game._alive = self._alive
+        game._num_alive = self._num_alive
+        game._next_seat = self._next_seat.copy()
+        game._prev_seat = self._prev_seat.copy()
+        game._current_seat = self._current_seat
+        game._seat_views = self._seat_views
+        game._perspectives = [None] * len(game._players)
+        game._dirty_seats = self._dirty_seats
+        game._game_active = self._game_active
+        game._winner = None
+        if self._winner is not None:
+            game._winner = game._players[self._seats[self._winner.name]]
+        game._game_state = self._game_state
+        game._action_table = self._action_table
+        game._encoder = self._encoder
+        game._poll_executor = None
+        if self._action_table is not None and self._encoder is not None:
+            for player in game._players:
+                player.bind(self._action_table, self._encoder)
+        return game
+
+    @classmethod
+    def from_state(cls, game_state: GameState, hands: Mapping[str, List[Character]], deck: List[Character],
+                   agents: Mapping[str, Agent], action_table: ActionTable, encoder: PerspectiveEncoder,
+                   rng: Optional[random.Random] = None, record_rewards: bool = True) -> "Game":
+        # builds a game at the start of the current player's turn from a public snapshot and a guess
+        # of the hidden cards, used to play out determinizations of a player's perspective
+        game: Game = cls(rng, action_table.rules, record_rewards=record_rewards)
+        game._deck = deck
+        for name in game_state.turn_order:
+            player_state: PlayerState = game_state.player_states[name]
+            player = Player(name, agents[name])
+            player.add_coins(player_state.coins)
+            player.revealed_characters.extend(player_state.revealed_characters)
+            for character in hands[name]:
+                player.add_character(character)
+            player.bind(action_table, encoder)
+            game._players.append(player)
+
+        game._seat_players()
+        game._dirty_seats = 0
+        game._current_seat = game._seats[game_state.current_player]
+        game._game_active = True
+        game._game_state = game_state
+        game._action_table = action_table
+        game._encoder = encoder
+        return game
 
     def enter_players(self, *args: Player) -> None:
-        names_this_far: List[str] = []
         for player in args:
-            if player.name in names_this_far:
+            if player.name in self._seats:
                 raise ValueError("Two players have the same username")
 
+            self._seats[player.name] = len(self._players)
             self._players.append(player)
-            names_this_far.append(player.name)
 
-    def initialise_game(self) -> None:
+    def initialise_game(self, logger: Optional[Logger] = None) -> None:
+        # deals the game and, with a logger, opens it with log_game_start so loggers that keep per
+        # game state, like replays and belief trackers, see every game the engine starts
         assert len(self._players) > 1
+        if len(self._players) > self._rules.max_players:
+            raise ValueError(f"The rules allow at most {self._rules.max_players} players")
 
         self._game_active = True
+        if self._reward_ledger is not None:
+            self._reward_ledger.clear()
+        self._rewards_delivered = False
+        names: List[str] = [player.name for player in self._players]
+        self._action_table = ActionTable(names, self._rules)
+        self._encoder = PerspectiveEncoder(names, self._rules.max_players)
+        for player in self._players:
+            player.bind(self._action_table, self._encoder)
+
         self._deal_coins()
         self._deal_characters()
         self._choose_starting_player()
         self._update_game_state()
+        if logger is not None:
+            logger.log_game_start(self.get_state())
 
     def handle_action(self, logger: Logger) -> None:
         game_state: Optional[GameState] = self.get_state()
-        instigator: Player = self._players[self._current_player_idx]
-
-        other_players: List[str] = []
-        for player in self._players:
-            if player.name == instigator.name:
-                continue
-            other_players.append(player.name)
-
-        players_that_can_challenge_action: List[int] = []
-        for player_idx in range(len(self._players)):
-            if self._players[player_idx].name == instigator.name:
-                continue
-            players_that_can_challenge_action.append(player_idx)
+        instigator: Player = self._players[self._current_seat]
+        players_that_can_challenge_action, other_players = self._seat_view(self._current_seat)
 
         claim: Claim = instigator.ask_for_action(other_players, self._get_player_perspective(instigator.name))
         logger.log_action(
@@ -64,17 +171,17 @@ class Game:
 
         if claim.target is None: # either income, foreign aid, tax or exchange
             if claim.action == Action.INCOME:
-                instigator.add_coins(1)
-                print(f"{instigator.name} gets income")
+                self._add_coins(instigator, 1)
+                logger.log_resolution(instigator.name, claim.action, None, 1, self.get_state())
 
-                instigator.propogate_reward(self._calculate_reward(1, 0, 0, 0, 0))
+                self._reward(instigator, coins_gained=1)
                 self._update_game_state()
                 logger.log_game_state(game_state=self.get_state())
 
             elif claim.action == Action.EXCHANGE:
                 challenger: Optional[str] = self._check_for_challenges(instigator.name, claim, players_that_can_challenge_action, logger)
                 if challenger is not None:
-                    success: bool = self._handle_challenge(instigator.name, challenger, claim)
+                    success: bool = self._handle_challenge(instigator.name, challenger, claim, logger)
                     logger.log_challenge(
                         instigator=instigator.name,
                         challenger=challenger,
@@ -92,18 +199,19 @@ class Game:
                 characters_to_put_back: List[Character] = instigator.exchange_cards(cards_left, self._get_player_perspective(instigator.name))
                 for character in characters_to_put_back:
                     self._deck.append(character)
-                random.shuffle(self._deck)
+                self._rng.shuffle(self._deck)
+                logger.log_exchange(instigator.name, cards_left, self.get_state())
 
-                print(f"{instigator.name} exchanges cards")
+                logger.log_resolution(instigator.name, claim.action, None, 0, self.get_state())
 
-                instigator.propogate_reward(self._calculate_reward(0, 0, 0, 0, cards_left))
+                self._reward(instigator, cards_seen=cards_left)
                 self._update_game_state()
                 logger.log_game_state(game_state=self.get_state())
 
             elif claim.action == Action.TAX:
                 challenger: Optional[str] = self._check_for_challenges(instigator.name, claim, players_that_can_challenge_action, logger)
                 if challenger is not None:
-                    success: bool = self._handle_challenge(instigator.name, challenger, claim)
+                    success: bool = self._handle_challenge(instigator.name, challenger, claim, logger)
                     logger.log_challenge(
                         instigator=instigator.name,
                         challenger=challenger,
@@ -114,10 +222,10 @@ class Game:
                     if success:
                         return
 
-                instigator.add_coins(3)
-                print(f"{instigator.name} gets tax")
+                self._add_coins(instigator, 3)
+                logger.log_resolution(instigator.name, claim.action, None, 3, self.get_state())
 
-                instigator.propogate_reward(self._calculate_reward(3, 0, 0, 0, 0))
+                self._reward(instigator, coins_gained=3)
                 self._update_game_state()
                 logger.log_game_state(game_state=self.get_state())
 
@@ -135,7 +243,7 @@ class Game:
 
                     challenger: Optional[str] = self._check_for_challenges(block.instigator, block.claim, players_that_can_challenge_block, logger)
                     if challenger is not None:
-                        success: bool = self._handle_challenge(block.instigator, challenger, block.claim)
+                        success: bool = self._handle_challenge(block.instigator, challenger, block.claim, logger)
                         logger.log_challenge(
                             instigator=block.instigator,
                             challenger=challenger,
@@ -150,10 +258,10 @@ class Game:
                         # might need to add something here to reward the person who successfully blocked
                         return # nobody challenged the block
 
-                instigator.add_coins(2)
-                print(f"{instigator.name} gets foreign aid")
+                self._add_coins(instigator, 2)
+                logger.log_resolution(instigator.name, claim.action, None, 2, self.get_state())
 
-                instigator.propogate_reward(self._calculate_reward(2, 0, 0, 0, 0))
+                self._reward(instigator, coins_gained=2)
                 self._update_game_state()
                 logger.log_game_state(game_state=self.get_state())
 
@@ -162,7 +270,7 @@ class Game:
                 # ask anyone who isn't the target or instigator if they want to challenge
                 challenger: Optional[str] = self._check_for_challenges(instigator.name, claim, players_that_can_challenge_action, logger)
                 if challenger is not None:
-                    success: bool = self._handle_challenge(instigator.name, challenger, claim)
+                    success: bool = self._handle_challenge(instigator.name, challenger, claim, logger)
                     logger.log_challenge(
                         instigator=instigator.name,
                         challenger=challenger,
@@ -174,7 +282,7 @@ class Game:
                         return
 
                 # check if target wants to block given that they didn't challenge
-                block: Optional[Block] = self._check_for_block(instigator.name, claim.action, [self._get_player_idx(claim.target)])
+                block: Optional[Block] = self._check_for_block(instigator.name, claim.action, (self._seats[claim.target],))
                 if block is not None:
                     logger.log_block(
                         instigator=instigator.name,
@@ -188,7 +296,7 @@ class Game:
 
                     challenger: Optional[str] = self._check_for_challenges(block.instigator, block.claim, players_that_can_challenge_block, logger)
                     if challenger is not None:
-                        success: bool = self._handle_challenge(block.instigator, challenger, block.claim)
+                        success: bool = self._handle_challenge(block.instigator, challenger, block.claim, logger)
                         logger.log_challenge(
                             instigator=block.instigator,
                             challenger=challenger,
@@ -197,20 +305,20 @@ class Game:
                             game_state=self.get_state()
                         )
                         if not success:
-                            instigator.add_coins(-3)
+                            self._add_coins(instigator, -self._rules.assassination_cost)
                             return # challenge to block failed
                     else:
                         # might need to add something here to reward the person who successfully blocked
-                        instigator.add_coins(-3)
+                        self._add_coins(instigator, -self._rules.assassination_cost)
                         return # nobody challenged the block
 
-                target_player: Player = self._players[self._get_player_idx(claim.target)]
-                target_player.remove_character(self._get_player_perspective(target_player.name))
-                instigator.add_coins(-3)
-                print(f"{instigator.name} assassinates {target_player.name}")
+                target_player: Player = self._players[self._seats[claim.target]]
+                self._remove_character(target_player, logger)
+                self._add_coins(instigator, -self._rules.assassination_cost)
+                logger.log_resolution(instigator.name, claim.action, target_player.name, -self._rules.assassination_cost, self.get_state())
 
-                instigator.propogate_reward(self._calculate_reward(-3, 0, 0, 1, 0))
-                target_player.propogate_reward(self._calculate_reward(0, 0, 1, 0, 0))
+                self._reward(instigator, coins_gained=-self._rules.assassination_cost, other_cards_lost=1)
+                self._reward(target_player, cards_lost=1)
                 self._update_game_state()
                 logger.log_game_state(game_state=self.get_state())
 
@@ -218,7 +326,7 @@ class Game:
                 # ask anyone who isn't the target or instigator if they want to challenge
                 challenger: Optional[str] = self._check_for_challenges(instigator.name, claim, players_that_can_challenge_action, logger)
                 if challenger is not None:
-                    success: bool = self._handle_challenge(instigator.name, challenger, claim)
+                    success: bool = self._handle_challenge(instigator.name, challenger, claim, logger)
                     logger.log_challenge(
                         instigator=instigator.name,
                         challenger=challenger,
@@ -230,7 +338,7 @@ class Game:
                         return
 
                 # check if target wants to block given that they didn't challenge
-                block: Optional[Block] = self._check_for_block(instigator.name, claim.action, [self._get_player_idx(claim.target)])
+                block: Optional[Block] = self._check_for_block(instigator.name, claim.action, (self._seats[claim.target],))
                 if block is not None:
                     logger.log_block(
                         instigator=instigator.name,
@@ -244,7 +352,7 @@ class Game:
 
                     challenger: Optional[str] = self._check_for_challenges(block.instigator, block.claim, players_that_can_challenge_block, logger)
                     if challenger is not None:
-                        success: bool = self._handle_challenge(block.instigator, challenger, block.claim)
+                        success: bool = self._handle_challenge(block.instigator, challenger, block.claim, logger)
                         logger.log_challenge(
                             instigator=block.instigator,
                             challenger=challenger,
@@ -258,38 +366,37 @@ class Game:
                         # might need to add something here to reward the person who successfully blocked
                         return # nobody challenged the block
 
-                target_player: Player = self._players[self._get_player_idx(claim.target)]
+                target_player: Player = self._players[self._seats[claim.target]]
                 coins_left = min(2, target_player.coins)
-                target_player.add_coins(-coins_left)
-                instigator.add_coins(coins_left)
-                print(f"{instigator.name} steals {coins_left} coins from {target_player.name}")
+                self._add_coins(target_player, -coins_left)
+                self._add_coins(instigator, coins_left)
+                logger.log_resolution(instigator.name, claim.action, target_player.name, coins_left, self.get_state())
 
-                instigator.propogate_reward(self._calculate_reward(coins_left, 0, 0, 0, 0))
-                target_player.propogate_reward(self._calculate_reward(-coins_left, 0, 0, 0, 0))
+                self._reward(instigator, coins_gained=coins_left)
+                self._reward(target_player, coins_gained=-coins_left)
                 self._update_game_state()
                 logger.log_game_state(game_state=self.get_state())
 
             elif claim.action == Action.COUP:
-                target_player: Player = self._players[self._get_player_idx(claim.target)]
-                target_player.remove_character(self._get_player_perspective(target_player.name))
-                instigator.add_coins(-7)
-                print(f"{instigator.name} couped against {target_player.name}")
+                target_player: Player = self._players[self._seats[claim.target]]
+                self._remove_character(target_player, logger)
+                self._add_coins(instigator, -self._rules.coup_cost)
+                logger.log_resolution(instigator.name, claim.action, target_player.name, -self._rules.coup_cost, self.get_state())
 
-                instigator.propogate_reward(self._calculate_reward(-7, 0, 0, 1, 0))
-                target_player.propogate_reward(self._calculate_reward(0, 0, 1, 0, 0))
+                self._reward(instigator, coins_gained=-self._rules.coup_cost, other_cards_lost=1)
+                self._reward(target_player, cards_lost=1)
                 self._update_game_state()
                 logger.log_game_state(game_state=self.get_state())
 
-    def _get_players_that_can_challenge(self, instigator: str):
-        players_that_can_challenge: List[int] = []
-        for player_idx in range(len(self._players)):
-            if self._players[player_idx].name == instigator:
-                continue
-            players_that_can_challenge.append(player_idx)
-        random.shuffle(players_that_can_challenge)
+    def _get_players_that_can_challenge(self, instigator: str) -> List[int]:
+        players_that_can_challenge: Sequence[int] = list(self._seat_view(self._seats[instigator])[0])
+        self._rng.shuffle(players_that_can_challenge)
         return players_that_can_challenge
 
-    def _check_for_block(self, instigator: str, action: Action, players_allowed: List[int]) -> Optional[Block]:
+    def _check_for_block(self, instigator: str, action: Action, players_allowed: Sequence[int]) -> Optional[Block]:
+        if self._can_poll_concurrently(players_allowed):
+            return self._poll_for_block(instigator, action, players_allowed)
+
         for player_idx in players_allowed:
             potential_blocker: Player = self._players[player_idx]
             if self._players[player_idx].name == instigator:
@@ -301,7 +408,10 @@ class Game:
 
         return None
 
-    def _check_for_challenges(self, instigator: str, claim: Claim, players_that_can_challenge: List[int], logger: Logger) -> Optional[str]:
+    def _check_for_challenges(self, instigator: str, claim: Claim, players_that_can_challenge: Sequence[int], logger: Logger) -> Optional[str]:
+        if self._can_poll_concurrently(players_that_can_challenge):
+            return self._poll_for_challenges(instigator, claim, players_that_can_challenge, logger)
+
         game_state: Optional[GameState] = self.get_state()
         for player_idx in players_that_can_challenge:
             potential_challenger: Player = self._players[player_idx]
@@ -317,131 +427,293 @@ class Game:
         # nobody challenged
         return None
 
-    def _handle_challenge(self, instigator: str, challenger: str, claim: Claim) -> bool:
-        action_to_roles = { Action.EXCHANGE: [Character.AMBASSADOR],
-                            Action.TAX: [Character.DUKE],
-                            Action.ASSASSINATE: [Character.ASSASSIN],
-                            Action.STEAL: [Character.CAPTAIN],
-                            Action.BLOCK_ASSASSINATE: [Character.CONTESSA],
-                            Action.BLOCK_STEALING: [Character.CAPTAIN, Character.AMBASSADOR],
-                            Action.BLOCK_FOREIGN_AID: [Character.DUKE] }
+    def _can_poll_concurrently(self, seats: Sequence[int]) -> bool:
+        # every polled agent needs its own random stream and no decision side effects besides it,
+        # otherwise the window is polled sequentially
+        if self._poll_executor is None or len(seats) < 2:
+            return False
+        agents: List[Agent] = [self._players[seat].agent for seat in seats]
+        return (all(agent.concurrent_polling for agent in agents)
+                and len({id(agent.get_rng()) for agent in agents}) == len(agents))
+
+    # the concurrent versions ask every eligible player and then walk the answers in the same
+    # priority order as the sequential loops. the answers up to the first yes are used as if they
+    # had been asked one by one, the players after it are rewound to their random state before the
+    # poll and their block decisions are never recorded, so the game plays out as the sequential one
+    def _poll_for_block(self, instigator: str, action: Action, players_allowed: Sequence[int]) -> Optional[Block]:
+        assert self._poll_executor is not None
+        players: List[Player] = [self._players[player_idx] for player_idx in players_allowed]
+        perspectives: List[Optional[PlayerPerspective]] = [self._get_player_perspective(player.name) for player in players]
+        rng_states = [player.agent.get_rng().getstate() for player in players]
+        futures = [self._poll_executor.submit(player.decide_block, instigator, action, perspective)
+                   for player, perspective in zip(players, perspectives)]
+        wait(futures)
+
+        block: Optional[Block] = None
+        for player, perspective, rng_state, future in zip(players, perspectives, rng_states, futures):
+            if block is not None:
+                player.agent.get_rng().setstate(rng_state)
+                continue
 
-        roles = action_to_roles.get(claim.action)
+            claim, legal_mask = future.result()
+            block = player.commit_block(claim, legal_mask, perspective)
+
+        return block
+
+    def _poll_for_challenges(self, instigator: str, claim: Claim, players_that_can_challenge: Sequence[int], logger: Logger) -> Optional[str]:
+        assert self._poll_executor is not None
+        game_state: Optional[GameState] = self.get_state()
+        potential_challengers: List[Player] = [self._players[player_idx] for player_idx in players_that_can_challenge
+                                               if self._players[player_idx].name != instigator]
+        rng_states = [potential_challenger.agent.get_rng().getstate() for potential_challenger in potential_challengers]
+        futures = [self._poll_executor.submit(potential_challenger.ask_to_challenge, instigator, claim,
+                                              self._get_player_perspective(potential_challenger.name))
+                   for potential_challenger in potential_challengers]
+        wait(futures)
+
+        challenger: Optional[str] = None
+        for potential_challenger, rng_state, future in zip(potential_challengers, rng_states, futures):
+            if challenger is not None:
+                potential_challenger.agent.get_rng().setstate(rng_state)
+            elif future.result():
+                challenger = potential_challenger.name
+            else:
+                logger.log_no_challenge(instigator, potential_challenger.name, claim.action, game_state)
+
+        return challenger
+
+    def _handle_challenge(self, instigator: str, challenger: str, claim: Claim, logger: Logger) -> bool:
+        roles = CLAIMED_CHARACTERS.get(claim.action)
         if roles is not None:
-            return self._apply_challenge(challenger, instigator, roles)
+            return self._apply_challenge(challenger, instigator, roles, logger)
 
-        print(claim)
-        assert False # need to implement the respective action
+        assert False, f"{claim} cannot be challenged" # need to implement the respective action
 
-    def _apply_challenge(self, challenger: str, instigator: str, characters_claiming: List[Character]) -> bool:
-        instigator_player: Player = self._players[self._get_player_idx(instigator)]
-        challenger_player: Player = self._players[self._get_player_idx(challenger)]
+    def _apply_challenge(self, challenger: str, instigator: str, characters_claiming: Sequence[Character], logger: Logger) -> bool:
+        instigator_player: Player = self._players[self._seats[instigator]]
+        challenger_player: Player = self._players[self._seats[challenger]]
         not_lying: bool = any(instigator_player.has_character(character) for character in characters_claiming)
         if not_lying:
-            challenger_player.remove_character(self._get_player_perspective(challenger))
+            self._remove_character(challenger_player, logger)
             instigator_player.add_character(self._deck.pop())
             character_to_put_back: List[Character] = instigator_player.exchange_cards(1, self._get_player_perspective(instigator))
             for character in character_to_put_back:
                 self._deck.append(character)
-            random.shuffle(self._deck)
+            self._rng.shuffle(self._deck)
+            logger.log_exchange(instigator, 1, self.get_state())
 
-            instigator_player.propogate_reward(self._calculate_reward(0, 0, 0, 1, 0))
-            challenger_player.propogate_reward(self._calculate_reward(0, 0, 1, 0, 0))
+            self._reward(instigator_player, other_cards_lost=1)
+            self._reward(challenger_player, cards_lost=1)
             return False
         else:
-            instigator_player.remove_character(self._get_player_perspective(instigator))
-            instigator_player.propogate_reward(self._calculate_reward(0, 0, 1, 0, 0))
-            challenger_player.propogate_reward(self._calculate_reward(0, 0, 0, 1, 0))
+            self._remove_character(instigator_player, logger)
+            self._reward(instigator_player, cards_lost=1)
+            self._reward(challenger_player, other_cards_lost=1)
             return True
 
-    def _calculate_reward(self, coins_gained: int, other_coins_lost: int, cards_lost: int, other_cards_lost: int, cards_seen: int) -> float:
-        total_reward: float = 0.0
-        total_reward += (coins_gained * 0.2)
-        total_reward += (other_coins_lost * 0.1)
-        total_reward += (cards_lost * -1.0)
-        total_reward += (other_cards_lost * 0.5)
-        total_reward += (cards_seen * 0.2)
+    def _add_coins(self, player: Player, coins: int) -> None:
+        player.add_coins(coins)
+        self._dirty_seats |= 1 << self._seats[player.name]
+
+    def _remove_character(self, player: Player, logger: Logger) -> None:
+        num_revealed: int = len(player.revealed_characters)
+        player.remove_character(self._get_player_perspective(player.name))
+        self._dirty_seats |= 1 << self._seats[player.name]
+        if len(player.revealed_characters) > num_revealed:
+            logger.log_reveal(player.name, player.revealed_characters[-1], self.get_state())
+
+    def _reward(self, player: Player, coins_gained: int = 0, other_coins_lost: int = 0, cards_lost: int = 0,
+                other_cards_lost: int = 0, cards_seen: int = 0, won: int = 0) -> None:
+        # ledger seats are the order players were entered in, the one of the encoder and the trajectories
+        if not self._record_rewards:
+            return
+        assert self._encoder is not None
+        if self._reward_ledger is None:
+            self._reward_ledger = RewardLedger()
+        self._reward_ledger.record(self._encoder.seat(player.name), self._turn, coins_gained, other_coins_lost,
+                                   cards_lost, other_cards_lost, cards_seen, won)
+        if self._stream_rewards:
+            player.propogate_reward(self._shaping.reward(coins_gained, other_coins_lost, cards_lost,
+                                                         other_cards_lost, cards_seen, won))
+
+    def deliver_rewards(self) -> None:
+        # hands every agent the total of its ledger rows once the game is over or cut short,
+        # streamed rewards were delivered already
+        if self._stream_rewards or self._rewards_delivered:
+            return
+
+        self._rewards_delivered = True
+        if self._reward_ledger is None:
+            # nothing was rewarded
+            return
+        assert self._encoder is not None
+        totals = self._reward_ledger.seat_totals(len(self._players), self._shaping)
+        for player in self._players:
+            player.propogate_reward(float(totals[self._encoder.seat(player.name)]))
 
-        return total_reward
+    def set_poll_executor(self, executor: Optional[Executor]) -> None:
+        # a thread pool lets slow or remote agents answer challenge and block windows in parallel,
+        # only agents marked concurrent_polling are polled this way and the game plays out exactly
+        # as the sequential poll would. clones always poll sequentially
+        self._poll_executor = executor
 
     def get_state(self) -> GameState:
-        game_state_copy: Optional[GameState] = copy.deepcopy(self._game_state)
-        assert game_state_copy is not None
-        return game_state_copy
+        # snapshots are immutable so they can be shared without copying
+        return self._game_state
+
+    def get_rules(self) -> Rules:
+        return self._rules
+
+    def get_action_table(self) -> Optional[ActionTable]:
+        return self._action_table
+
+    def get_encoder(self) -> Optional[PerspectiveEncoder]:
+        return self._encoder
+
+    def get_reward_ledger(self) -> RewardLedger:
+        if self._reward_ledger is None:
+            self._reward_ledger = RewardLedger()
+        return self._reward_ledger
 
     def get_player_name(self, idx: int) -> str:
-        assert len(self._players) > idx
-        return self._players[idx].name
+        # idx counts the players still in the rotation in turn order
+        names: Tuple[str, ...] = self._seat_view(NO_SEAT)[1]
+        assert len(names) > idx
+        return names[idx]
+
+    def get_winner(self) -> Optional[str]:
+        return self._winner.name if self._winner is not None else None
 
     def get_players_left(self) -> int:
-        return len(self._players)
+        return self._num_alive
 
     def game_is_active(self) -> bool:
         return self._game_active
 
     def _get_player_perspective(self, player_name: str) -> Optional[PlayerPerspective]:
-        game_state: GameState = self.get_state()
-        player: Player = self._players[self._get_player_idx(player_name)]
-        player_perspective = PlayerPerspective(game_state, player.name, player.characters)
+        # the snapshot is immutable and hands are tuples, so a perspective only holds references
+        # and stays correct when an agent keeps it
+        seat: int = self._seats[player_name]
+        player: Player = self._players[seat]
+        player_perspective: Optional[PlayerPerspective] = self._perspectives[seat]
+        if (player_perspective is None
+                or player_perspective.game_state is not self._game_state
+                or player_perspective.hidden_characters is not player.characters):
+            player_perspective = PlayerPerspective(self._game_state, player.name, player.characters)
+            self._perspectives[seat] = player_perspective
         return player_perspective
 
-    def _get_player_idx(self, player_name: str) -> int:
-        for player_idx in range(len(self._players)):
-            if self._players[player_idx].name == player_name:
-                return player_idx
-
-        raise ValueError(f"{player_name} does not exist")
+    def _seat_players(self) -> None:
+        # seats follow the order of self._players, every seat starts in the rotation
+        num_seats: int = len(self._players)
+        self._seats = {player.name: seat for seat, player in enumerate(self._players)}
+        self._alive = (1 << num_seats) - 1
+        self._num_alive = num_seats
+        self._next_seat = [(seat + 1) % num_seats for seat in range(num_seats)]
+        self._prev_seat = [(seat - 1) % num_seats for seat in range(num_seats)]
+        self._seat_views = {}
+        self._perspectives = [None] * num_seats
+        self._dirty_seats = self._alive
+
+    def _seat_view(self, excluded_seat: int) -> SeatView:
+        # cached per rotation, the views are shared and must not be modified
+        key: Tuple[int, int] = (self._alive, excluded_seat)
+        view: Optional[SeatView] = self._seat_views.get(key)
+        if view is None:
+            seats: Tuple[int, ...] = tuple(seat for seat in range(len(self._players))
+                                           if (self._alive >> seat) & 1 and seat != excluded_seat)
+            view = (seats, tuple(self._players[seat].name for seat in seats))
+            self._seat_views[key] = view
+        return view
+
+    def _remove_seat(self, seat: int) -> None:
+        next_seat: int = self._next_seat[seat]
+        prev_seat: int = self._prev_seat[seat]
+        self._next_seat[prev_seat] = next_seat
+        self._prev_seat[next_seat] = prev_seat
+        self._alive &= ~(1 << seat)
+        self._num_alive -= 1
 
     def _choose_starting_player(self) -> None:
-        random.shuffle(self._players)
-        self._current_player_idx = random.randrange(len(self._players))
+        self._rng.shuffle(self._players)
+        self._seat_players()
+        self._current_seat = self._rng.randrange(len(self._players))
 
     def goto_next_player(self) -> None:
+        # eliminated players leave the rotation once their turn comes up
         self._update_game_state()
-        if len(self._players[self._current_player_idx].characters) == 0:
-            del self._players[self._current_player_idx]
-            if self._current_player_idx >= len(self._players):
-                self._current_player_idx = 0
-        else:
-            self._current_player_idx = (self._current_player_idx + 1) % len(self._players)
-
-        while len(self._players) > 1 and len(self._players[self._current_player_idx].characters) == 0:
-            del self._players[self._current_player_idx]
-            if self._current_player_idx >= len(self._players):
-                self._current_player_idx = 0
-
+        seat: int = self._current_seat
+        next_seat: int = self._next_seat[seat]
+        if len(self._players[seat].characters) == 0:
+            self._remove_seat(seat)
+
+        while self._num_alive > 1 and len(self._players[next_seat].characters) == 0:
+            seat = next_seat
+            next_seat = self._next_seat[seat]
+            self._remove_seat(seat)
+
+        self._current_seat = next_seat
+        self._turn += 1
         self._update_game_state()
 
     def _deal_coins(self) -> None:
         for player in self._players:
             assert player.coins == 0
-            player.add_coins(2)
+            player.add_coins(self._rules.starting_coins)
 
     def _deal_characters(self) -> None:
-        random.shuffle(self._deck)
+        self._rng.shuffle(self._deck)
         for player in self._players:
             player.add_character(self._deck.pop())
             player.add_character(self._deck.pop())
 
     def declare_winner(self, logger: Logger) -> None:
         self._game_active = False
-        self._winner = self._players[0]
-        self._winner.propogate_reward(15)
+        self._winner = self._players[(self._alive & -self._alive).bit_length() - 1]
+        self._reward(self._winner, won=1)
         logger.log_winner(self._winner.name)
 
     def _update_game_state(self) -> None:
-        if self._game_state is None:
-            raise ValueError("Why is the game state None")
-
-        self._game_state.current_player = self._players[self._current_player_idx].name
-        self._game_state.num_players_alive = len(self._players)
-        self._game_state.turn_order = [player.name for player in self._players]
-        self._game_state.revealed_characters.clear()
-        for player in self._players:
-            self._game_state.player_states[player.name] = PlayerState(coins=player.coins,
-                                                                      revealed_characters=player.revealed_characters.copy(),
-                                                                      in_game=len(player.characters) > 0)
-
-        for name, player_state in self._game_state.player_states.items():
-            for character in player_state.revealed_characters:
-                self._game_state.revealed_characters.append(character)
+        # only the dirty seats are compared with their previous state, the rest of the snapshot is reused
+        previous: GameState = self._game_state
+        current_player: str = self._players[self._current_seat].name
+        if self._dirty_seats == 0 and previous.current_player == current_player and previous.num_players_alive == self._num_alive:
+            return
+
+        previous_states = previous.player_states
+        changed_states: Dict[str, PlayerState] = {}
+        revealed_changed: bool = False
+        dirty_seats: int = self._dirty_seats
+        self._dirty_seats = 0
+        while dirty_seats:
+            lowest: int = dirty_seats & -dirty_seats
+            dirty_seats ^= lowest
+            player: Player = self._players[lowest.bit_length() - 1]
+            in_game: bool = len(player.characters) > 0
+            previous_state: Optional[PlayerState] = previous_states.get(player.name)
+            if (previous_state is None
+                    or previous_state.coins != player.coins
+                    or previous_state.in_game != in_game
+                    or len(previous_state.revealed_characters) != len(player.revealed_characters)):
+                changed_states[player.name] = PlayerState(coins=player.coins,
+                                                          revealed_characters=tuple(player.revealed_characters),
+                                                          in_game=in_game)
+                revealed_changed = (revealed_changed or previous_state is None
+                                    or len(previous_state.revealed_characters) != len(player.revealed_characters))
+
+        player_states: Mapping[str, PlayerState] = previous_states
+        if changed_states:
+            updated_states: Dict[str, PlayerState] = dict(previous_states)
+            updated_states.update(changed_states)
+            player_states = MappingProxyType(updated_states)
+
+        revealed_characters: Tuple[Character, ...] = previous.revealed_characters
+        if revealed_changed:
+            revealed_characters = tuple(character for player_state in player_states.values()
+                                        for character in player_state.revealed_characters)
+
+        self._game_state = GameState(current_player=current_player,
+                                     num_players_alive=self._num_alive,
+                                     turn_order=self._seat_view(NO_SEAT)[1],
+                                     player_states=player_states,
+                                     revealed_characters=revealed_characters)
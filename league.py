@@ -0,0 +1,200 @@
+from agents import Agent
+from logger import NullLogger
+from runner import AGENT_TYPES, play_game
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations_with_replacement
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+import argparse
+import json
+import sqlite3
+
+AgentFactory = Callable[[], Agent]
+Match = Tuple[int, Tuple[str, ...]]
+# match id, winning variant or None when the game hit the turn limit, turns, reward per seat
+MatchResult = Tuple[int, Optional[str], int, List[float]]
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS matches (
+    match_id INTEGER PRIMARY KEY,
+    seating TEXT NOT NULL,
+    winner TEXT,
+    num_turns INTEGER NOT NULL,
+    rewards TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ratings (variant TEXT PRIMARY KEY, rating REAL NOT NULL, games INTEGER NOT NULL);
+"""
+
+class LeagueStore:
+    # results and ratings are written in the same transaction, so after an interruption the
+    # ratings always match the stored matches
+    def __init__(self, path: str) -> None:
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+
+    def check_config(self, config: Dict[str, object]) -> None:
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        encoded: str = json.dumps(config, sort_keys=True)
+        if row is None:
+            with self._connection:
+                self._connection.execute("INSERT INTO meta (key, value) VALUES ('config', ?)", (encoded,))
+        elif row[0] != encoded:
+            raise ValueError(f"The store was created for a different league: {row[0]}")
+
+    def completed_matches(self) -> Set[int]:
+        return {row[0] for row in self._connection.execute("SELECT match_id FROM matches")}
+
+    def load_ratings(self) -> Dict[str, Tuple[float, int]]:
+        return {variant: (rating, games) for variant, rating, games in self._connection.execute("SELECT variant, rating, games FROM ratings")}
+
+    def record(self, results: Iterable[Tuple[MatchResult, Tuple[str, ...]]], ratings: Mapping[str, Tuple[float, int]]) -> None:
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO matches (match_id, seating, winner, num_turns, rewards) VALUES (?, ?, ?, ?, ?)",
+                [(match_id, json.dumps(seating), winner, num_turns, json.dumps(rewards))
+                 for (match_id, winner, num_turns, rewards), seating in results])
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO ratings (variant, rating, games) VALUES (?, ?, ?)",
+                [(variant, rating, games) for variant, (rating, games) in ratings.items()])
+
+    def close(self) -> None:
+        self._connection.close()
+
+class League:
+    # round robin over every seating of table_size variants, each seating is played
+    # games_per_seating times. a variant may fill several seats of a table, seatings of a single
+    # variant are left out. game i of the schedule is seeded with (seed, i) and ratings are updated
+    # in schedule order, so a resumed run ends with the ratings of an uninterrupted one
+    def __init__(self, variants: Mapping[str, AgentFactory], store_path: str, table_size: int = 2,
+                 games_per_seating: int = 100, seed: int = 0, k_factor: float = 16.0,
+                 initial_rating: float = 1500.0, max_turns: int = 1000) -> None:
+        if len(variants) < 2 or table_size < 2:
+            raise ValueError("A league needs at least two variants and two seats per table")
+
+        self._variants: Dict[str, AgentFactory] = dict(variants)
+        self._table_size: int = table_size
+        self._games_per_seating: int = games_per_seating
+        self._seed: int = seed
+        self._k_factor: float = k_factor
+        self._max_turns: int = max_turns
+
+        self._store = LeagueStore(store_path)
+        self._store.check_config({
+            "variants": sorted(self._variants),
+            "table_size": table_size,
+            "games_per_seating": games_per_seating,
+            "seed": seed,
+            "max_turns": max_turns,
+            "repeated_variants": True
+        })
+
+        self._ratings: Dict[str, Tuple[float, int]] = {variant: (initial_rating, 0) for variant in self._variants}
+        self._ratings.update(self._store.load_ratings())
+
+    def schedule(self) -> List[Match]:
+        seatings = [seating for seating in combinations_with_replacement(sorted(self._variants), self._table_size)
+                    if len(set(seating)) > 1]
+        return [(match_id, seatings[match_id // self._games_per_seating])
+                for match_id in range(len(seatings) * self._games_per_seating)]
+
+    def pending(self) -> List[Match]:
+        completed: Set[int] = self._store.completed_matches()
+        return [match for match in self.schedule() if match[0] not in completed]
+
+    def run(self, num_workers: Optional[int] = None, chunk_size: int = 50) -> Dict[str, float]:
+        pending: List[Match] = self.pending()
+        chunks: List[List[Match]] = [pending[idx:idx + chunk_size] for idx in range(0, len(pending), chunk_size)]
+        seatings: Dict[int, Tuple[str, ...]] = dict(pending)
+
+        if num_workers == 1:
+            for chunk in chunks:
+                self._record(_play_matches(self._variants, chunk, self._seed, self._max_turns), seatings)
+        else:
+            # map hands the chunks back in schedule order whatever order the workers finish in
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                for results in executor.map(_play_matches, [self._variants] * len(chunks), chunks,
+                                            [self._seed] * len(chunks), [self._max_turns] * len(chunks)):
+                    self._record(results, seatings)
+
+        return self.ratings()
+
+    def ratings(self) -> Dict[str, float]:
+        return {variant: rating for variant, (rating, _) in self._ratings.items()}
+
+    def standings(self) -> str:
+        lines: List[str] = ["Rating  Games  Variant"]
+        for variant, (rating, games) in sorted(self._ratings.items(), key=lambda item: -item[1][0]):
+            lines.append(f"{rating:6.1f}  {games:5d}  {variant}")
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        self._store.close()
+
+    def _record(self, results: List[MatchResult], seatings: Mapping[int, Tuple[str, ...]]) -> None:
+        for match_id, winner, _, _ in results:
+            self._update_ratings(seatings[match_id], winner)
+        self._store.record([(result, seatings[result[0]]) for result in results], self._ratings)
+
+    def _update_ratings(self, seating: Sequence[str], winner: Optional[str]) -> None:
+        # multiplayer elo: the winner beats every other seat, each pairing is worth k / (n - 1).
+        # every copy of a variant is rated against the winner, copies of the winner itself are not
+        for variant in set(seating):
+            rating, games = self._ratings[variant]
+            self._ratings[variant] = (rating, games + 1)
+        if winner is None:
+            return
+
+        k: float = self._k_factor / (len(seating) - 1)
+        winner_rating: float = self._ratings[winner][0]
+        deltas: Dict[str, float] = {variant: 0.0 for variant in seating}
+        for loser in seating:
+            if loser == winner:
+                continue
+            expected: float = 1.0 / (1.0 + 10.0 ** ((self._ratings[loser][0] - winner_rating) / 400.0))
+            deltas[winner] += k * (1.0 - expected)
+            deltas[loser] -= k * (1.0 - expected)
+
+        for variant, delta in deltas.items():
+            rating, games = self._ratings[variant]
+            self._ratings[variant] = (rating + delta, games)
+
+def _play_matches(variants: Mapping[str, AgentFactory], matches: List[Match], seed: int, max_turns: int) -> List[MatchResult]:
+    # agents are reused for the whole chunk, one per copy of a variant at the table
+    logger = NullLogger()
+    agents: Dict[Tuple[str, int], Agent] = {}
+    results: List[MatchResult] = []
+    for match_id, seating in matches:
+        seats: List[Agent] = []
+        for seat, variant in enumerate(seating):
+            key: Tuple[str, int] = (variant, seating[:seat].count(variant))
+            if key not in agents:
+                agents[key] = variants[variant]()
+            seats.append(agents[key])
+
+        result = play_game(seats, logger, max_turns, seed, match_id)
+        winner: Optional[str] = seating[result.winner_seat] if result.winner_seat is not None else None
+        results.append((match_id, winner, result.num_turns, result.rewards))
+
+    for agent in agents.values():
+        agent.close()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a resumable round robin league and rate the agents")
+    parser.add_argument("variants", nargs="+", choices=sorted(AGENT_TYPES))
+    parser.add_argument("--db", default="league.sqlite")
+    parser.add_argument("--table-size", type=int, default=2)
+    parser.add_argument("--games", type=int, default=100, help="games per seating")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    args = parser.parse_args()
+
+    league = League({variant: AGENT_TYPES[variant] for variant in args.variants}, args.db, args.table_size,
+                    args.games, args.seed, max_turns=args.max_turns)
+    league.run(args.workers, args.chunk_size)
+    print(league.standings())
+    league.close()
@@ -0,0 +1,394 @@
+from utils import Rules, DEFAULT_RULES
+from agents import Agent
+from env import Decision, DecisionAgent, decision_spaces
+from logger import NullLogger
+from runner import AGENT_TYPES, play_game
+
+from multiprocessing.connection import Connection
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import argparse
+import multiprocessing
+import random
+import time
+import numpy as np
+
+# observations hold coins, counts and ids, scaled so the inputs stay around one
+OBSERVATION_SCALE: float = 0.1
+
+Weights = Dict[str, np.ndarray]
+
+# observations, legal_masks, actions and returns of many decisions, one row per decision
+Batch = Dict[str, np.ndarray]
+
+def _masked_softmax(logits: np.ndarray, legal_masks: np.ndarray) -> np.ndarray:
+    logits = np.where(legal_masks, logits, -np.inf)
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+class MLPPolicy:
+    # a softmax policy over the DecisionAgent action space with one tanh hidden layer, or a linear
+    # policy when hidden_size is 0. a value head on the same features is the baseline of the policy
+    # gradient. calling it samples one legal id per row, so it can also back a PolicyServer
+    def __init__(self, observation_size: int, num_actions: int, hidden_size: int = 64, seed: Optional[int] = None) -> None:
+        self._rng = np.random.default_rng(seed)
+        self.observation_size: int = observation_size
+        self.num_actions: int = num_actions
+        self.hidden_size: int = hidden_size
+
+        feature_size: int = hidden_size if hidden_size > 0 else observation_size
+        self.weights: Weights = {
+            "policy": np.zeros((feature_size, num_actions), dtype=np.float32),
+            "policy_bias": np.zeros(num_actions, dtype=np.float32),
+            "value": np.zeros(feature_size, dtype=np.float32),
+            "value_bias": np.zeros(1, dtype=np.float32),
+        }
+        if hidden_size > 0:
+            scale: float = 1.0 / np.sqrt(observation_size)
+            self.weights["hidden"] = self._rng.normal(0.0, scale, (observation_size, hidden_size)).astype(np.float32)
+            self.weights["hidden_bias"] = np.zeros(hidden_size, dtype=np.float32)
+
+    def get_weights(self) -> Weights:
+        return {name: weight.copy() for name, weight in self.weights.items()}
+
+    def set_weights(self, weights: Weights) -> None:
+        for name, weight in self.weights.items():
+            weight[...] = weights[name]
+
+    def save(self, path: str) -> None:
+        np.savez(path, observation_size=self.observation_size, num_actions=self.num_actions,
+                 hidden_size=self.hidden_size, **self.weights)
+
+    @classmethod
+    def load(cls, path: str) -> "MLPPolicy":
+        with np.load(path) as data:
+            policy = cls(int(data["observation_size"]), int(data["num_actions"]), int(data["hidden_size"]))
+            policy.set_weights({name: data[name] for name in policy.weights})
+        return policy
+
+    def probabilities(self, observations: np.ndarray, legal_masks: np.ndarray) -> np.ndarray:
+        return _masked_softmax(self._forward(observations)[2], legal_masks)
+
+    def __call__(self, observations: np.ndarray, legal_masks: np.ndarray) -> np.ndarray:
+        cumulative: np.ndarray = self.probabilities(observations, legal_masks).cumsum(axis=1)
+        draws: np.ndarray = self._rng.random((len(cumulative), 1)) * cumulative[:, -1:]
+        return np.minimum((cumulative <= draws).sum(axis=1), self.num_actions - 1)
+
+    def gradients(self, batch: Batch, entropy_coef: float = 0.01, value_coef: float = 0.5) -> Tuple[Weights, Dict[str, float]]:
+        # gradients of the mean policy gradient loss over the batch, advantages are the returns minus
+        # the value head and are normalised over the batch
+        inputs, features, logits, values = self._forward(batch["observations"])
+        legal_masks: np.ndarray = batch["legal_masks"]
+        actions: np.ndarray = batch["actions"]
+        returns: np.ndarray = batch["returns"]
+        num_rows: int = len(actions)
+        rows: np.ndarray = np.arange(num_rows)
+
+        probabilities: np.ndarray = _masked_softmax(logits, legal_masks)
+        log_probabilities: np.ndarray = np.log(np.where(legal_masks, probabilities, 1.0))
+        entropy: np.ndarray = -(probabilities * log_probabilities).sum(axis=1)
+        advantages: np.ndarray = returns - values
+        advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
+
+        # d(-A log p(a))/dz = A (p - onehot(a)) and d(-H)/dz = p (log p + H)
+        d_logits: np.ndarray = probabilities * advantages[:, None]
+        d_logits[rows, actions] -= advantages
+        d_logits += entropy_coef * probabilities * (log_probabilities + entropy[:, None])
+        d_logits /= num_rows
+        d_values: np.ndarray = value_coef * (values - returns) / num_rows
+
+        gradients: Weights = {
+            "policy": features.T @ d_logits,
+            "policy_bias": d_logits.sum(axis=0),
+            "value": features.T @ d_values,
+            "value_bias": np.array([d_values.sum()], dtype=np.float32),
+        }
+        if self.hidden_size > 0:
+            d_features: np.ndarray = d_logits @ self.weights["policy"].T + np.outer(d_values, self.weights["value"])
+            d_hidden: np.ndarray = d_features * (1.0 - features * features)
+            gradients["hidden"] = inputs.T @ d_hidden
+            gradients["hidden_bias"] = d_hidden.sum(axis=0)
+
+        stats: Dict[str, float] = {
+            "policy_loss": float(-(advantages * log_probabilities[rows, actions]).mean()),
+            "value_loss": float(((values - returns) ** 2).mean()),
+            "entropy": float(entropy.mean()),
+        }
+        return gradients, stats
+
+    def _forward(self, observations: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        inputs: np.ndarray = observations.astype(np.float32) * OBSERVATION_SCALE
+        features: np.ndarray = inputs
+        if self.hidden_size > 0:
+            features = np.tanh(inputs @ self.weights["hidden"] + self.weights["hidden_bias"])
+        logits: np.ndarray = features @ self.weights["policy"] + self.weights["policy_bias"]
+        values: np.ndarray = features @ self.weights["value"] + self.weights["value_bias"][0]
+        return inputs, features, logits, values
+
+class Adam:
+    # updates the weights in place, gradients are clipped to max_norm over all weights together
+    def __init__(self, weights: Weights, learning_rate: float = 3e-3, beta1: float = 0.9, beta2: float = 0.999,
+                 epsilon: float = 1e-8, max_norm: float = 1.0) -> None:
+        self.learning_rate: float = learning_rate
+        self._beta1: float = beta1
+        self._beta2: float = beta2
+        self._epsilon: float = epsilon
+        self._max_norm: float = max_norm
+        self._step: int = 0
+        self._first: Weights = {name: np.zeros_like(weight) for name, weight in weights.items()}
+        self._second: Weights = {name: np.zeros_like(weight) for name, weight in weights.items()}
+
+    def step(self, weights: Weights, gradients: Weights) -> float:
+        norm: float = float(np.sqrt(sum(float((gradient * gradient).sum()) for gradient in gradients.values())))
+        clip: float = min(1.0, self._max_norm / (norm + 1e-8))
+
+        self._step += 1
+        correction1: float = 1.0 - self._beta1 ** self._step
+        correction2: float = 1.0 - self._beta2 ** self._step
+        for name, weight in weights.items():
+            gradient: np.ndarray = gradients[name] * clip
+            self._first[name] = self._beta1 * self._first[name] + (1.0 - self._beta1) * gradient
+            self._second[name] = self._beta2 * self._second[name] + (1.0 - self._beta2) * gradient * gradient
+            weight -= (self.learning_rate * (self._first[name] / correction1)
+                       / (np.sqrt(self._second[name] / correction2) + self._epsilon)).astype(weight.dtype)
+        return norm
+
+class PolicyGradientAgent(DecisionAgent):
+    # samples its decisions from a policy and keeps them with the rewards that followed, take_episode
+    # returns the game's decisions with their discounted returns. greedy agents play the most likely
+    # id and are meant for evaluation
+    def __init__(self, policy: MLPPolicy, rng: Optional[random.Random] = None, greedy: bool = False, gamma: float = 1.0) -> None:
+        super().__init__(rng, 0)
+        self._policy: MLPPolicy = policy
+        self._greedy: bool = greedy
+        self._gamma: float = gamma
+        self._observations: List[np.ndarray] = []
+        self._legal_masks: List[np.ndarray] = []
+        self._actions: List[int] = []
+        self._rewards: List[float] = []
+
+    def propogate_reward(self, reward: float) -> None:
+        super().propogate_reward(reward)
+        # rewards before the first decision cannot be credited to any of them
+        if self._rewards:
+            self._rewards[-1] += reward
+
+    def reset_agent(self):
+        super().reset_agent()
+        self._observations = []
+        self._legal_masks = []
+        self._actions = []
+        self._rewards = []
+
+    def take_episode(self) -> Batch:
+        returns = np.zeros(len(self._rewards), dtype=np.float32)
+        future: float = 0.0
+        for step in range(len(self._rewards) - 1, -1, -1):
+            future = self._rewards[step] + self._gamma * future
+            returns[step] = future
+
+        num_actions, observation_size = self._policy.num_actions, self._policy.observation_size
+        episode: Batch = {
+            "observations": np.array(self._observations, dtype=np.int16).reshape(-1, observation_size),
+            "legal_masks": np.array(self._legal_masks, dtype=bool).reshape(-1, num_actions),
+            "actions": np.array(self._actions, dtype=np.int64),
+            "returns": returns,
+        }
+        self.reset_agent()
+        return episode
+
+    def _answer(self, decision: Decision) -> int:
+        probabilities: np.ndarray = self._policy.probabilities(decision.observation[None], decision.legal_mask[None])[0]
+        if self._greedy:
+            action_id = int(probabilities.argmax())
+        else:
+            cumulative: np.ndarray = probabilities.cumsum()
+            action_id = min(int(np.searchsorted(cumulative, self._rng.random() * cumulative[-1], side="right")), len(cumulative) - 1)
+
+        self._observations.append(decision.observation)
+        self._legal_masks.append(decision.legal_mask)
+        self._actions.append(action_id)
+        self._rewards.append(0.0)
+        return action_id
+
+def concatenate_batches(batches: Sequence[Batch]) -> Batch:
+    return {key: np.concatenate([batch[key] for batch in batches]) for key in batches[0]}
+
+def _actor_worker(connection: Connection, actor_idx: int, num_actors: int, num_players: int, hidden_size: int,
+                  opponent: Optional[str], gamma: float, max_turns: int, seed: Optional[int], rules: Rules) -> None:
+    # plays games on request with the latest weights it was sent, with no opponent type every seat learns
+    num_actions, observation_size = decision_spaces(num_players, rules)
+    policy = MLPPolicy(observation_size, num_actions, hidden_size)
+    learners: List[PolicyGradientAgent] = [PolicyGradientAgent(policy, gamma=gamma)
+                                           for _ in range(num_players if opponent is None else 1)]
+    agents: List[Agent] = learners + [AGENT_TYPES[opponent]() for _ in range(num_players - len(learners))]  # type: ignore[index]
+    logger = NullLogger()
+
+    # actors take turns through the game indices so seeded runs never repeat a game
+    game_idx: int = actor_idx
+    try:
+        while True:
+            command, data = connection.recv()
+            if command == "collect":
+                weights, num_games = data
+                if weights is not None:
+                    policy.set_weights(weights)
+
+                episodes: List[Batch] = []
+                num_wins: int = 0
+                num_turns: int = 0
+                for _ in range(num_games):
+                    # streamed, the learners credit every reward to the decision before it
+                    result = play_game(agents, logger, max_turns, seed, game_idx, rules=rules, stream_rewards=True)
+                    game_idx += num_actors
+                    episodes.extend(learner.take_episode() for learner in learners)
+                    num_wins += result.winner_seat is not None and result.winner_seat < len(learners)
+                    num_turns += result.num_turns
+                connection.send((concatenate_batches(episodes), num_games, num_wins, num_turns))
+            elif command == "close":
+                break
+    finally:
+        for agent in agents:
+            agent.close()
+        connection.close()
+
+class Trainer:
+    # actor processes play games with a copy of the policy while the learner applies batched updates.
+    # every update uses one batch from each actor, and an actor is sent its next request as soon as
+    # its batch arrives, so games are played during the update with weights at most sync_interval
+    # updates old
+    def __init__(self, num_players: int = 3, num_actors: int = 4, games_per_batch: int = 8, hidden_size: int = 64,
+                 learning_rate: float = 1e-3, entropy_coef: float = 0.03, value_coef: float = 0.5, gamma: float = 1.0,
+                 sync_interval: int = 1, opponent: Optional[str] = None, max_turns: int = 200,
+                 seed: Optional[int] = None, rules: Rules = DEFAULT_RULES, context: Optional[str] = None) -> None:
+        if opponent is not None and opponent not in AGENT_TYPES:
+            raise ValueError(f"{opponent} is not a known agent type")
+        assert num_actors > 0 and sync_interval > 0
+
+        num_actions, observation_size = decision_spaces(num_players, rules)
+        self.policy = MLPPolicy(observation_size, num_actions, hidden_size, seed)
+        self._optimizer = Adam(self.policy.weights, learning_rate)
+        self._num_players: int = num_players
+        self._games_per_batch: int = games_per_batch
+        self._entropy_coef: float = entropy_coef
+        self._value_coef: float = value_coef
+        self._sync_interval: int = sync_interval
+        self._max_turns: int = max_turns
+        self._rules: Rules = rules
+        self._num_updates: int = 0
+        self._requested: bool = False
+
+        ctx = multiprocessing.get_context(context)
+        self._connections: List[Connection] = []
+        self._processes = []
+        for actor_idx in range(num_actors):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_actor_worker, daemon=True,
+                                  args=(child, actor_idx, num_actors, num_players, hidden_size, opponent, gamma, max_turns, seed, rules))
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    @property
+    def num_updates(self) -> int:
+        return self._num_updates
+
+    def __enter__(self) -> "Trainer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def train(self, num_updates: int, callback: Optional[Callable[[Dict[str, float]], None]] = None) -> List[Dict[str, float]]:
+        if not self._requested:
+            weights: Weights = self.policy.get_weights()
+            for connection in self._connections:
+                connection.send(("collect", (weights, self._games_per_batch)))
+            self._requested = True
+
+        history: List[Dict[str, float]] = []
+        for _ in range(num_updates):
+            start: float = time.perf_counter()
+            weights = self.policy.get_weights() if self._num_updates % self._sync_interval == 0 else None
+            batches: List[Batch] = []
+            num_games, num_wins, num_turns = 0, 0, 0
+            for connection in self._connections:
+                batch, games, wins, turns = connection.recv()
+                connection.send(("collect", (weights, self._games_per_batch)))
+                batches.append(batch)
+                num_games += games
+                num_wins += wins
+                num_turns += turns
+
+            batch = concatenate_batches(batches)
+            gradients, stats = self.policy.gradients(batch, self._entropy_coef, self._value_coef)
+            stats["grad_norm"] = self._optimizer.step(self.policy.weights, gradients)
+            self._num_updates += 1
+
+            stats.update({
+                "update": float(self._num_updates),
+                "decisions": float(len(batch["actions"])),
+                "games": float(num_games),
+                "learner_win_rate": num_wins / num_games,
+                "mean_game_length": num_turns / num_games,
+                "seconds": time.perf_counter() - start,
+            })
+            history.append(stats)
+            if callback is not None:
+                callback(stats)
+        return history
+
+    def evaluate(self, opponent: str = "RuleBasedAgent", num_games: int = 200, seed: int = 0) -> float:
+        # win rate of the greedy policy in seat 0 against num_players - 1 opponents
+        agents: List[Agent] = [PolicyGradientAgent(self.policy, greedy=True)]
+        agents += [AGENT_TYPES[opponent]() for _ in range(self._num_players - 1)]
+        logger = NullLogger()
+        num_wins: int = sum(play_game(agents, logger, self._max_turns, seed, game_idx, rules=self._rules).winner_seat == 0
+                            for game_idx in range(num_games))
+        for agent in agents:
+            agent.close()
+        return num_wins / num_games
+
+    def close(self) -> None:
+        # the actors still owe the batches of the last requests
+        for connection in self._connections:
+            if self._requested:
+                connection.recv()
+            connection.send(("close", None))
+        for process in self._processes:
+            process.join()
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        self._processes = []
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a policy gradient agent by self-play")
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument("--actors", type=int, default=4)
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--games-per-batch", type=int, default=8, help="games each actor plays per update")
+    parser.add_argument("--hidden", type=int, default=64, help="hidden units, 0 for a linear policy")
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--entropy", type=float, default=0.03)
+    parser.add_argument("--gamma", type=float, default=1.0)
+    parser.add_argument("--sync-interval", type=int, default=1, help="updates between weight pushes to the actors")
+    parser.add_argument("--opponent", choices=sorted(AGENT_TYPES), default=None, help="train against this agent instead of self-play")
+    parser.add_argument("--eval-every", type=int, default=50)
+    parser.add_argument("--eval-games", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=None, help="save the weights to this .npz path")
+    args = parser.parse_args()
+
+    with Trainer(args.players, args.actors, args.games_per_batch, args.hidden, args.lr, args.entropy,
+                 gamma=args.gamma, sync_interval=args.sync_interval, opponent=args.opponent, seed=args.seed) as trainer:
+        while trainer.num_updates < args.updates:
+            history = trainer.train(min(args.eval_every, args.updates - trainer.num_updates))
+            last: Dict[str, float] = history[-1]
+            decisions_per_sec: float = sum(stats["decisions"] for stats in history) / sum(stats["seconds"] for stats in history)
+            print(f"update {trainer.num_updates}: entropy {last['entropy']:.3f}, value loss {last['value_loss']:.2f}, "
+                  f"{decisions_per_sec:.0f} decisions/s, win rate vs RuleBasedAgent {trainer.evaluate(num_games=args.eval_games):.3f}")
+
+        if args.output is not None:
+            trainer.policy.save(args.output)
@@ -1,11 +1,18 @@
-from utils import GameState, Action
+from utils import GameState, Action, Character
 
-from typing import Optional
+from typing import Any, Dict, List, Optional, TextIO, Union
+import json
+import queue
+import threading
 
 class Logger:
     def __init__(self) -> None:
         pass
 
+    def log_game_start(self, game_state: Optional[GameState]) -> None:
+        if game_state is not None:
+            print("Turn Order: " + " -> ".join(game_state.turn_order))
+
     def log_turn_start(self, player_name: str, game_state: Optional[GameState]) -> None:
         print(f"{player_name}'s turn")
 
@@ -27,8 +34,272 @@ class Logger:
     def log_block(self, instigator: str, blocker: str, action: Action, block_action: Action, game_state: Optional[GameState]) -> None:
         print(f"{blocker} blocked {instigator} claiming {block_action}")
 
+    def log_resolution(self, instigator: str, action: Action, target: Optional[str], coins: int, game_state: Optional[GameState]) -> None:
+        # coins is the change to the instigator's purse
+        if action == Action.INCOME:
+            print(f"{instigator} gets income")
+        elif action == Action.FOREIGN_AID:
+            print(f"{instigator} gets foreign aid")
+        elif action == Action.TAX:
+            print(f"{instigator} gets tax")
+        elif action == Action.EXCHANGE:
+            print(f"{instigator} exchanges cards")
+        elif action == Action.ASSASSINATE:
+            print(f"{instigator} assassinates {target}")
+        elif action == Action.STEAL:
+            print(f"{instigator} steals {coins} coins from {target}")
+        elif action == Action.COUP:
+            print(f"{instigator} couped against {target}")
+
+    def log_reveal(self, player_name: str, character: Character, game_state: Optional[GameState]) -> None:
+        print(f"{player_name} revealed {character}")
+
+    def log_exchange(self, player_name: str, num_cards: int, game_state: Optional[GameState]) -> None:
+        print(f"{player_name} exchanged {num_cards} card(s) with the deck")
+
     def log_game_state(self, game_state: Optional[GameState]) -> None:
         print("Game State updated")
 
     def log_winner(self, winner: str) -> None:
         print(f"Winner: {winner}")
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+class NullLogger(Logger):
+    # discards everything, used for batch simulation
+    def log_game_start(self, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_turn_start(self, player_name: str, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_action(self, instigator: str, action: Action, target: Optional[str], game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_challenge(self, instigator: str, challenger: str, action: Action, success: bool, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_no_challenge(self, instigator: str, allower: str, action: Action, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_block(self, instigator: str, blocker: str, action: Action, block_action: Action, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_resolution(self, instigator: str, action: Action, target: Optional[str], coins: int, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_reveal(self, player_name: str, character: Character, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_exchange(self, player_name: str, num_cards: int, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_game_state(self, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_winner(self, winner: str) -> None:
+        pass
+
+class MultiLogger(Logger):
+    # forwards every event to each of the loggers in order
+    def __init__(self, *loggers: Logger) -> None:
+        super().__init__()
+        self._loggers: List[Logger] = list(loggers)
+
+    def log_game_start(self, game_state: Optional[GameState]) -> None:
+        for logger in self._loggers:
+            logger.log_game_start(game_state)
+
+    def log_turn_start(self, player_name: str, game_state: Optional[GameState]) -> None:
+        for logger in self._loggers:
+            logger.log_turn_start(player_name, game_state)
+
+    def log_action(self, instigator: str, action: Action, target: Optional[str], game_state: Optional[GameState]) -> None:
+        for logger in self._loggers:
+            logger.log_action(instigator, action, target, game_state)
+
+    def log_challenge(self, instigator: str, challenger: str, action: Action, success: bool, game_state: Optional[GameState]) -> None:
+        for logger in self._loggers:
+            logger.log_challenge(instigator, challenger, action, success, game_state)
+
+    def log_no_challenge(self, instigator: str, allower: str, action: Action, game_state: Optional[GameState]) -> None:
+        for logger in self._loggers:
+            logger.log_no_challenge(instigator, allower, action, game_state)
+
+    def log_block(self, instigator: str, blocker: str, action: Action, block_action: Action, game_state: Optional[GameState]) -> None:
+        for logger in self._loggers:
+            logger.log_block(instigator, blocker, action, block_action, game_state)
+
+    def log_resolution(self, instigator: str, action: Action, target: Optional[str], coins: int, game_state: Optional[GameState]) -> None:
+        for logger in self._loggers:
+            logger.log_resolution(instigator, action, target, coins, game_state)
+
+    def log_reveal(self, player_name: str, character: Character, game_state: Optional[GameState]) -> None:
+        for logger in self._loggers:
+            logger.log_reveal(player_name, character, game_state)
+
+    def log_exchange(self, player_name: str, num_cards: int, game_state: Optional[GameState]) -> None:
+        for logger in self._loggers:
+            logger.log_exchange(player_name, num_cards, game_state)
+
+    def log_game_state(self, game_state: Optional[GameState]) -> None:
+        for logger in self._loggers:
+            logger.log_game_state(game_state)
+
+    def log_winner(self, winner: str) -> None:
+        for logger in self._loggers:
+            logger.log_winner(winner)
+
+    def flush(self) -> None:
+        for logger in self._loggers:
+            logger.flush()
+
+    def close(self) -> None:
+        for logger in self._loggers:
+            logger.close()
+
+Record = Dict[str, Any]
+
+class JsonlSink:
+    def __init__(self, path: str) -> None:
+        self._file: TextIO = open(path, "a", encoding="utf-8")
+
+    def write(self, records: List[Record]) -> None:
+        self._file.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+class ThreadedSink:
+    # hands batches of records to a background thread so the engine never waits on the disk.
+    # a failed write is raised from the next write, flush or close, the batches after it are dropped
+    def __init__(self, sink: JsonlSink, max_pending_batches: int = 64) -> None:
+        self._sink: JsonlSink = sink
+        self._queue: "queue.Queue[Optional[List[Record]]]" = queue.Queue(maxsize=max_pending_batches)
+        self._error: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, records: List[Record]) -> None:
+        self._raise_error()
+        self._queue.put(records)
+
+    def flush(self) -> None:
+        self._queue.join()
+        self._raise_error()
+        self._sink.flush()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self._sink.close()
+        self._raise_error()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        while True:
+            records = self._queue.get()
+            try:
+                if records is None:
+                    return
+                if self._error is None:
+                    self._sink.write(records)
+            except Exception as error:
+                # the thread keeps draining so flush and write never wait on a dead writer
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+Sink = Union[JsonlSink, ThreadedSink]
+
+class StructuredLogger(Logger):
+    # turns every event into a flat record and writes them to the sink in batches,
+    # game states are left out unless include_state is set
+    def __init__(self, sink: Sink, buffer_size: int = 4096, include_state: bool = False) -> None:
+        super().__init__()
+        self._sink: Sink = sink
+        self._buffer_size: int = buffer_size
+        self._include_state: bool = include_state
+        self._buffer: List[Record] = []
+
+    def log_game_start(self, game_state: Optional[GameState]) -> None:
+        turn_order = list(game_state.turn_order) if game_state is not None else []
+        self._record({"event": "game_start", "turn_order": turn_order}, game_state)
+
+    def log_turn_start(self, player_name: str, game_state: Optional[GameState]) -> None:
+        self._record({"event": "turn_start", "player": player_name}, game_state)
+
+    def log_action(self, instigator: str, action: Action, target: Optional[str], game_state: Optional[GameState]) -> None:
+        self._record({"event": "action", "instigator": instigator, "action": action.name, "target": target}, game_state)
+
+    def log_challenge(self, instigator: str, challenger: str, action: Action, success: bool, game_state: Optional[GameState]) -> None:
+        self._record({"event": "challenge", "instigator": instigator, "challenger": challenger,
+                      "action": action.name, "success": success}, game_state)
+
+    def log_no_challenge(self, instigator: str, allower: str, action: Action, game_state: Optional[GameState]) -> None:
+        self._record({"event": "no_challenge", "instigator": instigator, "allower": allower, "action": action.name}, game_state)
+
+    def log_block(self, instigator: str, blocker: str, action: Action, block_action: Action, game_state: Optional[GameState]) -> None:
+        self._record({"event": "block", "instigator": instigator, "blocker": blocker,
+                      "action": action.name, "block_action": block_action.name}, game_state)
+
+    def log_resolution(self, instigator: str, action: Action, target: Optional[str], coins: int, game_state: Optional[GameState]) -> None:
+        self._record({"event": "resolution", "instigator": instigator, "action": action.name,
+                      "target": target, "coins": coins}, game_state)
+
+    def log_reveal(self, player_name: str, character: Character, game_state: Optional[GameState]) -> None:
+        self._record({"event": "reveal", "player": player_name, "character": character.name}, game_state)
+
+    def log_exchange(self, player_name: str, num_cards: int, game_state: Optional[GameState]) -> None:
+        self._record({"event": "exchange", "player": player_name, "num_cards": num_cards}, game_state)
+
+    def log_game_state(self, game_state: Optional[GameState]) -> None:
+        if self._include_state:
+            self._record({"event": "game_state"}, game_state)
+
+    def log_winner(self, winner: str) -> None:
+        self._record({"event": "winner", "winner": winner}, None)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._sink.write(self._buffer)
+            self._buffer = []
+        self._sink.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._sink.close()
+
+    def _record(self, record: Record, game_state: Optional[GameState]) -> None:
+        if self._include_state and game_state is not None:
+            record["game_state"] = _state_to_record(game_state)
+
+        self._buffer.append(record)
+        if len(self._buffer) >= self._buffer_size:
+            # the sink keeps the list, so start a new one instead of clearing it
+            self._sink.write(self._buffer)
+            self._buffer = []
+
+def _state_to_record(game_state: GameState) -> Record:
+    return {
+        "current_player": game_state.current_player,
+        "turn_order": list(game_state.turn_order),
+        "player_states": {
+            name: {
+                "coins": state.coins,
+                "revealed": [character.name for character in state.revealed_characters],
+                "in_game": state.in_game
+            }
+            for name, state in game_state.player_states.items()
+        }
+    }
@@ -14,8 +14,8 @@ if __name__ == "__main__":
     # Play a game
     game = Game()
     game.enter_players(*players)
-    game.initialise_game()
     logger = Logger()
+    game.initialise_game(logger)
 
     while game.game_is_active():
         game.handle_action(logger)
@@ -24,5 +24,6 @@ if __name__ == "__main__":
         if game.get_players_left() <= 1:
             game.declare_winner(logger)
             break
+    game.deliver_rewards()
 
     print(f"Game finished! Winner: {game._winner.name if game._winner else 'No winner'}")
@@ -2,42 +2,64 @@ from __future__ import annotations
 
 from utils import Action, Claim, Block, PlayerPerspective, Character
 from agents import Agent
+from actions import ActionTable
+from encoding import PerspectiveEncoder
 
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
 
 
 class Player:
     def __init__(self, name: str, agent: Agent) -> None:
         self._coins: int = 0
         self._name: str = name
-        self._characters: List[Character] = []
+        # the hand is a tuple and changes replace it, so a hand handed out in a perspective keeps
+        # showing the hand as it was
+        self._characters: Tuple[Character, ...] = ()
         self._revealed_characters: List[Character] = []
         self._log: dict = {}
         self._agent: Agent = agent
+        self._action_table: Optional[ActionTable] = None
 
     @property
     def name(self) -> str:
         return self._name
 
+    @property
+    def agent(self) -> Agent:
+        return self._agent
+
     @property
     def coins(self) -> int:
         return self._coins
 
     @property
-    def characters(self) -> List[Character]:
+    def characters(self) -> Tuple[Character, ...]:
         return self._characters
 
     @property
     def revealed_characters(self) -> List[Character]:
         return self._revealed_characters
 
+    def clone(self, agent: Agent) -> Player:
+        # copies the mutable state only, the agent is replaced
+        player = Player(self._name, agent)
+        player._coins = self._coins
+        player._characters = self._characters
+        player._revealed_characters = self._revealed_characters.copy()
+        player._action_table = self._action_table
+        return player
+
+    def bind(self, action_table: ActionTable, encoder: PerspectiveEncoder) -> None:
+        self._action_table = action_table
+        self._agent.bind(action_table, encoder)
+
     def add_coins(self, value: int) -> None:
         assert(self._coins >= 0)
         self._coins += value
 
     def reset(self) -> None:
         self._coins = 0
-        self._characters.clear()
+        self._characters = ()
         self._revealed_characters.clear()
         self._log.clear()
 
@@ -49,59 +71,40 @@ class Player:
         return challenged
 
     def ask_to_block(self, instigator: str, action: Action, player_perspective: Optional[PlayerPerspective]) -> Optional[Block]:
-        assert player_perspective is not None
+        claim, legal_mask = self.decide_block(instigator, action, player_perspective)
+        return self.commit_block(claim, legal_mask, player_perspective)
 
-        legal_responses: List[Claim] = [Claim(Action.NO_RESPONSE, None)]
+    def decide_block(self, instigator: str, action: Action, player_perspective: Optional[PlayerPerspective]) -> Tuple[Claim, int]:
+        # the decision without recording it, concurrent polls only commit the answers they use
+        assert player_perspective is not None
+        assert self._action_table is not None
 
-        if action == Action.STEAL:
-            legal_responses.append(Claim(Action.BLOCK_STEALING, instigator))
-        elif action == Action.ASSASSINATE:
-            legal_responses.append(Claim(Action.BLOCK_ASSASSINATE, instigator))
-        elif action == Action.FOREIGN_AID:
-            legal_responses.append(Claim(Action.BLOCK_FOREIGN_AID, instigator))
+        legal_responses, legal_mask = self._action_table.block_claims(instigator, action)
 
         claim: Optional[Claim] = self._agent.choose_to_block(legal_responses, action, player_perspective)
-        assert claim is not None and claim in legal_responses
+        assert claim is not None and self._action_table.is_legal(claim, legal_mask)
+        return claim, legal_mask
 
-        self._agent.extend_trajectory(claim, legal_responses, player_perspective)
+    def commit_block(self, claim: Claim, legal_mask: int, player_perspective: Optional[PlayerPerspective]) -> Optional[Block]:
+        self._agent.extend_trajectory(claim, legal_mask, player_perspective)
 
         if claim.action != Action.NO_RESPONSE:
             return Block(claim=claim, instigator=self.name)
         
         return None
 
-    def ask_for_action(self, other_players: List[str], player_perspective: Optional[PlayerPerspective]) -> Claim:
+    def ask_for_action(self, other_players: Sequence[str], player_perspective: Optional[PlayerPerspective]) -> Claim:
         assert player_perspective is not None
+        assert self._action_table is not None
 
-        legal_claims: List[Claim] = [
-            Claim(Action.INCOME, None),
-            Claim(Action.FOREIGN_AID, None),
-            Claim(Action.TAX, None),
-            Claim(Action.EXCHANGE, None),
-        ]
-
-        for player_name in other_players:
-            legal_claims.append(Claim(Action.STEAL, player_name))
-
-        if self.coins >= 3:
-            for player_name in other_players:
-                legal_claims.append(Claim(Action.ASSASSINATE, player_name))
-
-        if self.coins >= 7:
-            for player_name in other_players:
-                legal_claims.append(Claim(Action.COUP, player_name))
-
-        if self.coins >= 10:
-            legal_claims.clear()
-            for player_name in other_players:
-                legal_claims.append(Claim(Action.COUP, player_name))
+        legal_claims, legal_mask = self._action_table.action_claims(other_players, self.coins)
 
         claim: Claim = self._agent.choose_action(legal_claims, player_perspective)
 
-        if claim not in legal_claims:
+        if not self._action_table.is_legal(claim, legal_mask):
             raise ValueError(f"{claim} not in {legal_claims}")
 
-        self._agent.extend_trajectory(claim, legal_claims, player_perspective)
+        self._agent.extend_trajectory(claim, legal_mask, player_perspective)
 
         return claim
 
@@ -109,15 +112,15 @@ class Player:
         return character in self.characters
 
     def add_character(self, character: Character) -> None:
-        self.characters.append(character)
+        self._characters = self._characters + (character,)
 
     def remove_character(self, player_perspective: Optional[PlayerPerspective]) -> None:
         if len(self.characters) <= 0:
             return
 
-        character = self._agent.choose_character(self.characters.copy(), player_perspective)
+        character = self._agent.choose_character(list(self.characters), player_perspective)
         if character in self.characters:
-            self._characters.remove(character)
+            self._characters = _without(self._characters, [character])
             self._revealed_characters.append(character)
         else:
             raise AssertionError("The selected character does not exist in the player's hand.")
@@ -125,20 +128,28 @@ class Player:
     def exchange_cards(self, num_cards_to_exchange: int, player_perspective: Optional[PlayerPerspective]) -> List[Character]:
         assert player_perspective is not None
 
-        legal_exchanges = self.characters.copy()
+        legal_exchanges = list(self.characters)
         characters_to_exchange = self._agent.exchange_cards(num_cards_to_exchange, legal_exchanges, player_perspective)
 
         assert len(characters_to_exchange) == num_cards_to_exchange
 
         characters_to_put_back = []
+        hand: List[Character] = list(self._characters)
         for character in characters_to_exchange:
-            if character in self._characters:
-                self._characters.remove(character)
+            if character in hand:
+                hand.remove(character)
                 characters_to_put_back.append(character)
             else:
                 raise AssertionError("Attempted to exchange a character not in hand.")
 
+        self._characters = tuple(hand)
         return characters_to_put_back
 
     def propogate_reward(self, reward: float) -> None:
         self._agent.propogate_reward(reward)
+
+def _without(characters: Tuple[Character, ...], removed: Sequence[Character]) -> Tuple[Character, ...]:
+    remaining: List[Character] = list(characters)
+    for character in removed:
+        remaining.remove(character)
+    return tuple(remaining)
@@ -0,0 +1,145 @@
+from env import Decision, DecisionAgent
+
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+import queue
+import random
+import threading
+import time
+import numpy as np
+
+# maps a batch of observations [batch, width] and legal masks [batch, actions] to one action id per row
+Policy = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+Request = Tuple[np.ndarray, np.ndarray, "Future[int]"]
+
+class PolicyServer:
+    # collects decisions from agents in many concurrently running games and evaluates them as one
+    # batch. a batch is sent once it holds max_batch_size decisions or max_wait seconds after its
+    # first decision arrived, whichever comes first
+    def __init__(self, policy: Policy, max_batch_size: int = 256, max_wait: float = 0.002) -> None:
+        assert max_batch_size > 0
+
+        self._policy: Policy = policy
+        self._max_batch_size: int = max_batch_size
+        self._max_wait: float = max_wait
+        self._requests: "queue.SimpleQueue[Optional[Request]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._num_batches: int = 0
+        self._num_decisions: int = 0
+
+    @property
+    def num_batches(self) -> int:
+        return self._num_batches
+
+    @property
+    def num_decisions(self) -> int:
+        return self._num_decisions
+
+    def mean_batch_size(self) -> float:
+        if self._num_batches == 0:
+            return 0.0
+        return self._num_decisions / self._num_batches
+
+    def set_policy(self, policy: Policy) -> None:
+        # takes effect from the next batch
+        self._policy = policy
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._serve, name="policy-server", daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._requests.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "PolicyServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def submit(self, observation: np.ndarray, legal_mask: np.ndarray) -> "Future[int]":
+        future: "Future[int]" = Future()
+        self._requests.put((observation, legal_mask, future))
+        return future
+
+    def decide(self, observation: np.ndarray, legal_mask: np.ndarray) -> int:
+        return self.submit(observation, legal_mask).result()
+
+    def _serve(self) -> None:
+        while True:
+            first: Optional[Request] = self._requests.get()
+            if first is None:
+                return
+
+            batch: List[Request] = [first]
+            stopping: bool = False
+            deadline: float = time.perf_counter() + self._max_wait
+            while len(batch) < self._max_batch_size:
+                timeout: float = deadline - time.perf_counter()
+                try:
+                    request: Optional[Request] = self._requests.get(timeout=timeout) if timeout > 0 else self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+
+            self._evaluate(batch)
+            if stopping:
+                return
+
+    def _evaluate(self, batch: List[Request]) -> None:
+        # masks of tables with fewer seats are padded with illegal ids
+        num_actions: int = max(legal_mask.shape[0] for _, legal_mask, _ in batch)
+        observations: np.ndarray = np.stack([observation for observation, _, _ in batch])
+        legal_masks = np.zeros((len(batch), num_actions), dtype=bool)
+        for row, (_, legal_mask, _) in enumerate(batch):
+            legal_masks[row, :legal_mask.shape[0]] = legal_mask
+
+        try:
+            action_ids = np.asarray(self._policy(observations, legal_masks))
+        except Exception as error:
+            for _, _, future in batch:
+                future.set_exception(error)
+            return
+
+        self._num_batches += 1
+        self._num_decisions += len(batch)
+        for row, (_, _, future) in enumerate(batch):
+            action_id: int = int(action_ids[row])
+            if not 0 <= action_id < num_actions or not legal_masks[row, action_id]:
+                future.set_exception(ValueError(f"The policy chose the illegal action {action_id}"))
+            else:
+                future.set_result(action_id)
+
+class ServedAgent(DecisionAgent):
+    # an agent whose decisions are made by a policy server, games using it must run on
+    # separate threads for the server to see more than one decision at a time. its decisions draw
+    # from the policy's random state in batch order, which the engine cannot rewind, so challenge
+    # and block windows are polled one player at a time
+    concurrent_polling: bool = False
+
+    def __init__(self, server: PolicyServer, rng: Optional[random.Random] = None, trajectory_capacity: int = 0) -> None:
+        super().__init__(rng, trajectory_capacity)
+        self._server: PolicyServer = server
+
+    def _answer(self, decision: Decision) -> int:
+        return self._server.decide(decision.observation, decision.legal_mask)
+
+def random_policy(seed: Optional[int] = None) -> Policy:
+    # uniform over the legal ids of every row, useful to measure the serving overhead
+    rng = np.random.default_rng(seed)
+
+    def policy(observations: np.ndarray, legal_masks: np.ndarray) -> np.ndarray:
+        scores = rng.random(legal_masks.shape)
+        scores[~legal_masks] = -1.0
+        return scores.argmax(axis=1)
+
+    return policy
@@ -0,0 +1,148 @@
+from game import Game
+from agents import Agent
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import threading
+import time
+
+# game methods timed as engine phases
+GAME_PHASES: Dict[str, str] = {
+    "handle_action": "turn",
+    "_check_for_challenges": "challenge_polling",
+    "_check_for_block": "block_polling",
+    "_handle_challenge": "challenge_resolution",
+    "_get_player_perspective": "perspective",
+}
+AGENT_DECISIONS: List[str] = ["choose_action", "choose_to_challenge", "choose_to_block", "choose_character", "exchange_cards"]
+
+class PhaseStats:
+    __slots__ = ("calls", "total_ns", "self_ns")
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.total_ns: int = 0
+        self.self_ns: int = 0
+
+class Profiler:
+    # times engine phases and agent decisions by wrapping the methods of one game's instances,
+    # nothing in the engine knows about it so a game that is not attached pays nothing
+    def __init__(self) -> None:
+        self._stats: Dict[str, PhaseStats] = {}
+        self._counters: Dict[str, int] = {}
+        self._folded: Dict[Tuple[str, ...], int] = {}
+        # name, start time, time spent in nested phases. agents polled concurrently are timed on
+        # their own thread's stack
+        self._local = threading.local()
+        # poll threads leave phases at the same time, the shared tables are only changed under the lock
+        self._lock = threading.Lock()
+        self._attached: List[Tuple[object, str]] = []
+
+    def attach(self, game: Game) -> None:
+        for method, phase in GAME_PHASES.items():
+            self._wrap(game, method, phase)
+
+        for player in game._players:
+            self._wrap(player, "ask_for_action", "action_choice")
+            agent: Agent = player._agent
+            # one row per seat, two agents of the same type are timed apart
+            for method in AGENT_DECISIONS:
+                self._wrap(agent, method, f"agent:{player.name}:{type(agent).__name__}.{method}")
+
+    def detach(self) -> None:
+        for instance, method in self._attached:
+            instance.__dict__.pop(method, None)
+        self._attached.clear()
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def stats(self) -> Dict[str, PhaseStats]:
+        return self._stats
+
+    def counters(self) -> Dict[str, int]:
+        return self._counters
+
+    def summary(self) -> str:
+        lines: List[str] = [f"{'phase':<52} {'calls':>10} {'total ms':>10} {'self ms':>10} {'mean us':>10}"]
+        for name, stats in sorted(self._stats.items(), key=lambda item: -item[1].total_ns):
+            lines.append(f"{name:<52} {stats.calls:>10} {stats.total_ns / 1e6:>10.1f} {stats.self_ns / 1e6:>10.1f} "
+                         f"{stats.total_ns / stats.calls / 1e3:>10.2f}")
+        for name, value in sorted(self._counters.items()):
+            lines.append(f"{name:<52} {value:>10}")
+        return "\n".join(lines)
+
+    def folded(self) -> str:
+        # collapsed stack format read by flamegraph.pl, inferno and speedscope, weights are self time in us
+        return "\n".join(f"{';'.join(stack)} {self_ns // 1000}" for stack, self_ns in sorted(self._folded.items()) if self_ns >= 1000)
+
+    def export_folded(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as folded_file:
+            folded_file.write(self.folded() + "\n")
+
+    def _wrap(self, instance: object, method: str, phase: str) -> None:
+        if method in instance.__dict__:
+            return
+
+        func: Callable[..., Any] = getattr(instance, method)
+        enter = self._enter
+        leave = self._leave
+
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            enter(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                leave()
+
+        setattr(instance, method, timed)
+        self._attached.append((instance, method))
+
+    def _stack(self) -> List[List[Any]]:
+        stack: Optional[List[List[Any]]] = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = []
+            self._local.stack = stack
+        return stack
+
+    def _enter(self, phase: str) -> None:
+        self._stack().append([phase, time.perf_counter_ns(), 0])
+
+    def _leave(self) -> None:
+        frames: List[List[Any]] = self._stack()
+        phase, start, nested_ns = frames.pop()
+        elapsed_ns: int = time.perf_counter_ns() - start
+        stack: Tuple[str, ...] = tuple(frame[0] for frame in frames) + (phase,)
+        with self._lock:
+            stats = self._stats.get(phase)
+            if stats is None:
+                stats = PhaseStats()
+                self._stats[phase] = stats
+            stats.calls += 1
+            stats.total_ns += elapsed_ns
+            stats.self_ns += elapsed_ns - nested_ns
+            self._folded[stack] = self._folded.get(stack, 0) + elapsed_ns - nested_ns
+        if frames:
+            frames[-1][2] += elapsed_ns
+
+if __name__ == "__main__":
+    from logger import NullLogger
+    from runner import AGENT_TYPES, play_game
+
+    parser = argparse.ArgumentParser(description="Profile the phases of a number of games")
+    parser.add_argument("seats", nargs="+", choices=sorted(AGENT_TYPES))
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folded", default=None, help="write collapsed stacks for a flamegraph to this path")
+    args = parser.parse_args()
+
+    profiler = Profiler()
+    logger = NullLogger()
+    agents: List[Agent] = [AGENT_TYPES[name]() for name in args.seats]
+    for game_idx in range(args.games):
+        play_game(agents, logger, seed=args.seed, game_idx=game_idx, profiler=profiler)
+
+    print(profiler.summary())
+    if args.folded is not None:
+        profiler.export_folded(args.folded)
@@ -0,0 +1,249 @@
+from utils import Action, Character, GameState
+from logger import Logger
+
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+import mmap
+import os
+import struct
+import numpy as np
+
+# segment files hold a file header followed by games, each game is a fixed header, the seat
+# names and then fixed size event records; a sidecar .idx file holds the byte offset of every
+# game as uint64 so a reader can jump straight to game i
+FILE_MAGIC: bytes = b"COUPRPL1"
+FILE_HEADER = struct.Struct("<8sH6x")
+GAME_MAGIC: bytes = b"GAME"
+GAME_HEADER = struct.Struct("<4sQIBbxx")
+NAME_SIZE: int = 16
+EVENT = struct.Struct("<BbbBBxh")
+OFFSET = struct.Struct("<Q")
+VERSION: int = 1
+
+EVENT_DTYPE = np.dtype([
+    ("type", "u1"),
+    ("actor", "i1"),
+    ("other", "i1"),
+    ("action", "u1"),
+    ("character", "u1"),
+    ("pad", "u1"),
+    ("value", "<i2"),
+])
+assert EVENT_DTYPE.itemsize == EVENT.size
+
+NO_SEAT: int = -1
+
+# event types, actor is always the player making the decision
+CLAIM: int = 1          # other = target, value = 0
+CHALLENGE: int = 2      # other = instigator, value = 1 if the challenge succeeded
+NO_CHALLENGE: int = 3   # other = instigator
+BLOCK: int = 4          # other = instigator, action = the block claimed
+REVEAL: int = 5         # character = the revealed character
+EXCHANGE: int = 6       # value = number of cards exchanged with the deck
+RESOLUTION: int = 7     # other = target, value = change to the actor's coins
+
+class ReplayGame:
+    def __init__(self, game_id: int, names: List[str], winner: int, events: np.ndarray) -> None:
+        self.game_id: int = game_id
+        self.names: List[str] = names
+        self.winner: int = winner
+        self.events: np.ndarray = events
+
+    @property
+    def winner_name(self) -> Optional[str]:
+        return self.names[self.winner] if self.winner != NO_SEAT else None
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+class ReplayWriter:
+    def __init__(self, directory: str, prefix: str = "replays", segment_bytes: int = 1 << 30) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self._directory: str = directory
+        self._prefix: str = prefix
+        self._segment_bytes: int = segment_bytes
+        # appending to an existing directory continues the game ids in new segments
+        existing: List[str] = _segment_paths(directory, prefix)
+        self._segment: int = len(existing)
+        self._num_games: int = sum(os.path.getsize(path[:-len(".bin")] + ".idx") // OFFSET.size for path in existing)
+        self._data: Optional[BinaryIO] = None
+        self._index: Optional[BinaryIO] = None
+        self._size: int = 0
+
+    @property
+    def num_games(self) -> int:
+        return self._num_games
+
+    def write_game(self, names: List[str], winner: int, events: bytes) -> None:
+        assert len(events) % EVENT.size == 0
+        assert len(names) < 128
+
+        header = GAME_HEADER.pack(GAME_MAGIC, self._num_games, len(events) // EVENT.size, len(names), winner)
+        encoded_names = b"".join(name.encode("utf-8")[:NAME_SIZE].ljust(NAME_SIZE, b"\0") for name in names)
+        game_size: int = len(header) + len(encoded_names) + len(events)
+
+        if self._data is None or (self._size > FILE_HEADER.size and self._size + game_size > self._segment_bytes):
+            self._open_segment()
+        assert self._data is not None and self._index is not None
+
+        self._index.write(OFFSET.pack(self._size))
+        self._data.write(header)
+        self._data.write(encoded_names)
+        self._data.write(events)
+        self._size += game_size
+        self._num_games += 1
+
+    def flush(self) -> None:
+        if self._data is not None and self._index is not None:
+            self._data.flush()
+            self._index.flush()
+
+    def close(self) -> None:
+        if self._data is not None and self._index is not None:
+            self._data.close()
+            self._index.close()
+        self._data = None
+        self._index = None
+
+    def _open_segment(self) -> None:
+        self.close()
+        path: str = os.path.join(self._directory, f"{self._prefix}-{self._segment:05d}.bin")
+        self._segment += 1
+        self._data = open(path, "wb")
+        self._index = open(path[:-len(".bin")] + ".idx", "wb")
+        self._data.write(FILE_HEADER.pack(FILE_MAGIC, VERSION))
+        self._size = FILE_HEADER.size
+
+class ReplayReader:
+    # memory maps every segment, games and events are decoded on access only
+    def __init__(self, directory: str, prefix: str = "replays") -> None:
+        self._segments: List[Tuple[mmap.mmap, np.ndarray]] = []
+        self._first_game: List[int] = []
+        num_games: int = 0
+
+        for path in _segment_paths(directory, prefix):
+            index_path = path[:-len(".bin")] + ".idx"
+            if os.path.getsize(path) <= FILE_HEADER.size or os.path.getsize(index_path) < OFFSET.size:
+                continue
+
+            with open(path, "rb") as data_file:
+                data = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version = FILE_HEADER.unpack_from(data, 0)
+            if magic != FILE_MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} replay segment")
+
+            offsets = np.memmap(index_path, dtype="<u8", mode="r", shape=(os.path.getsize(index_path) // OFFSET.size,))
+            self._segments.append((data, offsets))
+            self._first_game.append(num_games)
+            num_games += len(offsets)
+
+        self._num_games: int = num_games
+
+    def __len__(self) -> int:
+        return self._num_games
+
+    def game(self, game_idx: int) -> ReplayGame:
+        data, offset = self._locate(game_idx)
+        magic, game_id, num_events, num_players, winner = GAME_HEADER.unpack_from(data, offset)
+        if magic != GAME_MAGIC:
+            raise ValueError(f"Game {game_idx} is corrupt")
+
+        offset += GAME_HEADER.size
+        names = [data[offset + seat * NAME_SIZE:offset + (seat + 1) * NAME_SIZE].rstrip(b"\0").decode("utf-8")
+                 for seat in range(num_players)]
+        offset += num_players * NAME_SIZE
+        events = np.frombuffer(data, dtype=EVENT_DTYPE, count=num_events, offset=offset)
+        return ReplayGame(game_id, names, winner, events)
+
+    def event(self, game_idx: int, event_idx: int) -> Tuple[int, int, int, int, int, int]:
+        data, offset = self._locate(game_idx)
+        num_events, num_players = GAME_HEADER.unpack_from(data, offset)[2:4]
+        if not 0 <= event_idx < num_events:
+            raise IndexError(f"Game {game_idx} has no event {event_idx}")
+
+        offset += GAME_HEADER.size + num_players * NAME_SIZE + event_idx * EVENT.size
+        return EVENT.unpack_from(data, offset)
+
+    def __iter__(self) -> Iterator[ReplayGame]:
+        for game_idx in range(self._num_games):
+            yield self.game(game_idx)
+
+    def _locate(self, game_idx: int) -> Tuple[mmap.mmap, int]:
+        if not 0 <= game_idx < self._num_games:
+            raise IndexError(f"There is no game {game_idx}")
+
+        segment: int = int(np.searchsorted(self._first_game, game_idx, side="right")) - 1
+        data, offsets = self._segments[segment]
+        return data, int(offsets[game_idx - self._first_game[segment]])
+
+class ReplayLogger(Logger):
+    # records the events of each game and hands them to the writer once the game is over,
+    # a game that is still running when the next one starts is stored without a winner
+    def __init__(self, writer: ReplayWriter) -> None:
+        super().__init__()
+        self._writer: ReplayWriter = writer
+        self._names: List[str] = []
+        self._seats: Dict[str, int] = {}
+        self._events: bytearray = bytearray()
+        self._in_game: bool = False
+
+    def log_game_start(self, game_state: Optional[GameState]) -> None:
+        assert game_state is not None
+        if self._in_game:
+            self._finish(NO_SEAT)
+
+        self._names = list(game_state.turn_order)
+        self._seats = {name: seat for seat, name in enumerate(self._names)}
+        self._in_game = True
+
+    def log_turn_start(self, player_name: str, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_action(self, instigator: str, action: Action, target: Optional[str], game_state: Optional[GameState]) -> None:
+        self._add(CLAIM, instigator, target, action, 0)
+
+    def log_challenge(self, instigator: str, challenger: str, action: Action, success: bool, game_state: Optional[GameState]) -> None:
+        self._add(CHALLENGE, challenger, instigator, action, int(success))
+
+    def log_no_challenge(self, instigator: str, allower: str, action: Action, game_state: Optional[GameState]) -> None:
+        self._add(NO_CHALLENGE, allower, instigator, action, 0)
+
+    def log_block(self, instigator: str, blocker: str, action: Action, block_action: Action, game_state: Optional[GameState]) -> None:
+        self._add(BLOCK, blocker, instigator, block_action, 0)
+
+    def log_resolution(self, instigator: str, action: Action, target: Optional[str], coins: int, game_state: Optional[GameState]) -> None:
+        self._add(RESOLUTION, instigator, target, action, coins)
+
+    def log_reveal(self, player_name: str, character: Character, game_state: Optional[GameState]) -> None:
+        self._events += EVENT.pack(REVEAL, self._seats[player_name], NO_SEAT, 0, character.value, 0)
+
+    def log_exchange(self, player_name: str, num_cards: int, game_state: Optional[GameState]) -> None:
+        self._events += EVENT.pack(EXCHANGE, self._seats[player_name], NO_SEAT, 0, 0, num_cards)
+
+    def log_game_state(self, game_state: Optional[GameState]) -> None:
+        pass
+
+    def log_winner(self, winner: str) -> None:
+        self._finish(self._seats[winner])
+
+    def flush(self) -> None:
+        self._writer.flush()
+
+    def close(self) -> None:
+        if self._in_game:
+            self._finish(NO_SEAT)
+        self._writer.close()
+
+    def _add(self, event_type: int, actor: str, other: Optional[str], action: Action, value: int) -> None:
+        other_seat: int = self._seats[other] if other is not None else NO_SEAT
+        self._events += EVENT.pack(event_type, self._seats[actor], other_seat, action.value, 0, value)
+
+    def _finish(self, winner: int) -> None:
+        self._writer.write_game(self._names, winner, bytes(self._events))
+        self._events.clear()
+        self._in_game = False
+
+def _segment_paths(directory: str, prefix: str) -> List[str]:
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if name.startswith(prefix + "-") and name.endswith(".bin"))
+    return [os.path.join(directory, name) for name in names]
@@ -0,0 +1,80 @@
+from dataclasses import astuple, dataclass
+from typing import List, Sequence, Tuple
+import numpy as np
+
+# ledger columns, every row is one reward event of one seat
+SEAT: int = 0
+STEP: int = 1             # turn of the game the event happened in
+COINS_GAINED: int = 2     # negative when coins were paid or stolen
+OTHER_COINS_LOST: int = 3
+CARDS_LOST: int = 4
+OTHER_CARDS_LOST: int = 5
+CARDS_SEEN: int = 6
+WON: int = 7
+NUM_COLUMNS: int = 8
+
+COMPONENTS = slice(COINS_GAINED, NUM_COLUMNS)
+
+@dataclass(frozen=True)
+class RewardShaping:
+    # coefficients of the reward components in column order, a reward is the dot product of a
+    # row's components with these
+    coins_gained: float = 0.2
+    other_coins_lost: float = 0.1
+    cards_lost: float = -1.0
+    other_cards_lost: float = 0.5
+    cards_seen: float = 0.2
+    won: float = 15.0
+
+    def coefficients(self) -> np.ndarray:
+        return np.array(astuple(self), dtype=np.float64)
+
+    def reward(self, coins_gained: int, other_coins_lost: int, cards_lost: int, other_cards_lost: int,
+               cards_seen: int, won: int = 0) -> float:
+        total_reward: float = 0.0
+        total_reward += (coins_gained * self.coins_gained)
+        total_reward += (other_coins_lost * self.other_coins_lost)
+        total_reward += (cards_lost * self.cards_lost)
+        total_reward += (other_cards_lost * self.other_cards_lost)
+        total_reward += (cards_seen * self.cards_seen)
+        total_reward += (won * self.won)
+        return total_reward
+
+DEFAULT_SHAPING: RewardShaping = RewardShaping()
+
+# the reward components of a game as rows of integers, so the rewards can be recomputed with other
+# shaping coefficients without replaying the game. rows are recorded as tuples and only become an
+# array when the ledger is read
+class RewardLedger:
+    def __init__(self) -> None:
+        self._rows: List[Tuple[int, ...]] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def record(self, seat: int, step: int, coins_gained: int = 0, other_coins_lost: int = 0, cards_lost: int = 0,
+               other_cards_lost: int = 0, cards_seen: int = 0, won: int = 0) -> None:
+        self._rows.append((seat, step, coins_gained, other_coins_lost, cards_lost, other_cards_lost, cards_seen, won))
+
+    def clear(self) -> None:
+        self._rows.clear()
+
+    def rows(self) -> np.ndarray:
+        # a new array, so it stays valid after the ledger is cleared for the next game
+        return np.array(self._rows, dtype=np.int32).reshape(len(self._rows), NUM_COLUMNS)
+
+    def rewards(self, shaping: RewardShaping = DEFAULT_SHAPING) -> np.ndarray:
+        return shape_rewards(self.rows(), shaping)
+
+    def seat_totals(self, num_seats: int, shaping: RewardShaping = DEFAULT_SHAPING) -> np.ndarray:
+        return seat_totals(self.rows(), num_seats, shaping)
+
+def shape_rewards(rows: np.ndarray, shaping: RewardShaping = DEFAULT_SHAPING) -> np.ndarray:
+    # one reward per row, rows of many games can be stacked and reshaped in one call
+    return rows[:, COMPONENTS] @ shaping.coefficients()
+
+def seat_totals(rows: np.ndarray, num_seats: int, shaping: RewardShaping = DEFAULT_SHAPING) -> np.ndarray:
+    return np.bincount(rows[:, SEAT], weights=shape_rewards(rows, shaping), minlength=num_seats)
+
+def stack_ledgers(ledgers: Sequence[RewardLedger]) -> np.ndarray:
+    return np.concatenate([ledger.rows() for ledger in ledgers]) if ledgers else np.zeros((0, NUM_COLUMNS), dtype=np.int32)
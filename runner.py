@@ -0,0 +1,197 @@
+from player import Player
+from utils import Rules, DEFAULT_RULES, derive_rng
+from agents import Agent, ISMCTSAgent, RandomAgent, RuleBasedAgent
+from game import Game
+from logger import Logger, NullLogger
+from profiler import Profiler
+from rewards import DEFAULT_SHAPING, RewardLedger, RewardShaping
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+import argparse
+import random
+
+AGENT_TYPES: Dict[str, Type[Agent]] = {
+    "RandomAgent": RandomAgent,
+    "RuleBasedAgent": RuleBasedAgent,
+    "ISMCTSAgent": ISMCTSAgent,
+}
+
+@dataclass
+class GameResult:
+    winner_seat: Optional[int]
+    num_turns: int
+    rewards: List[float]
+
+@dataclass
+class BatchResult:
+    seat_config: List[str]
+    seed: Optional[int] = None
+    num_games: int = 0
+    unfinished_games: int = 0
+    total_turns: int = 0
+    wins: List[int] = field(default_factory=list)
+    reward_totals: List[float] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        if not self.wins:
+            self.wins = [0] * len(self.seat_config)
+        if not self.reward_totals:
+            self.reward_totals = [0.0] * len(self.seat_config)
+
+    def add_game(self, result: GameResult) -> None:
+        self.num_games += 1
+        self.total_turns += result.num_turns
+        if result.winner_seat is None:
+            self.unfinished_games += 1
+        else:
+            self.wins[result.winner_seat] += 1
+
+        for seat, reward in enumerate(result.rewards):
+            self.reward_totals[seat] += reward
+
+    def merge(self, other: "BatchResult") -> None:
+        assert self.seat_config == other.seat_config and self.seed == other.seed
+
+        self.num_games += other.num_games
+        self.unfinished_games += other.unfinished_games
+        self.total_turns += other.total_turns
+        for seat in range(len(self.seat_config)):
+            self.wins[seat] += other.wins[seat]
+            self.reward_totals[seat] += other.reward_totals[seat]
+
+    def win_rates(self) -> List[float]:
+        if self.num_games == 0:
+            return [0.0] * len(self.seat_config)
+        return [wins / self.num_games for wins in self.wins]
+
+    def mean_game_length(self) -> float:
+        if self.num_games == 0:
+            return 0.0
+        return self.total_turns / self.num_games
+
+    def mean_rewards(self) -> List[float]:
+        if self.num_games == 0:
+            return [0.0] * len(self.seat_config)
+        return [reward / self.num_games for reward in self.reward_totals]
+
+    def __str__(self):
+        lines = [
+            f"Games: {self.num_games} ({self.unfinished_games} unfinished), seed {self.seed}",
+            f"Mean Game Length: {self.mean_game_length():.2f} turns",
+            "Seats:"
+        ]
+        for seat, (agent_name, win_rate, reward) in enumerate(zip(self.seat_config, self.win_rates(), self.mean_rewards())):
+            lines.append(f"  [{seat}] {agent_name}: win rate {win_rate:.3f}, mean reward {reward:.3f}")
+        return "\n".join(lines)
+
+def play_game(agents: Sequence[Agent], logger: Logger, max_turns: int = 1000,
+              seed: Optional[int] = None, game_idx: int = 0, profiler: Optional[Profiler] = None,
+              poll_executor: Optional[Executor] = None, rules: Rules = DEFAULT_RULES,
+              shaping: RewardShaping = DEFAULT_SHAPING, reward_ledger: Optional[RewardLedger] = None,
+              stream_rewards: bool = False) -> GameResult:
+    # seats are named after their index in agents so results can be mapped back after the shuffle,
+    # with a seed the game and every agent draw from streams derived from (seed, game_idx).
+    # a reward_ledger passed in holds the game's reward rows afterwards, agents get their reward
+    # totals when the game ends unless stream_rewards is set
+    for seat, agent in enumerate(agents):
+        agent.reset_agent()
+        if seed is not None:
+            agent.set_rng(derive_rng(seed, game_idx, seat + 1))
+    players: List[Player] = [Player(f"seat_{seat}", agent) for seat, agent in enumerate(agents)]
+
+    game = Game(derive_rng(seed, game_idx) if seed is not None else None, rules, shaping, reward_ledger, stream_rewards)
+    game.enter_players(*players)
+    game.initialise_game(logger)
+    game.set_poll_executor(poll_executor)
+    if profiler is not None:
+        profiler.attach(game)
+
+    num_turns: int = 0
+    while game.game_is_active() and num_turns < max_turns:
+        game.handle_action(logger)
+        game.goto_next_player()
+        num_turns += 1
+
+        if game.get_players_left() <= 1:
+            game.declare_winner(logger)
+            break
+    game.deliver_rewards()
+
+    if profiler is not None:
+        profiler.detach()
+        profiler.count("games")
+        profiler.count("turns", num_turns)
+
+    winner_seat: Optional[int] = None
+    winner: Optional[str] = game.get_winner()
+    if winner is not None:
+        winner_seat = int(winner.split("_")[1])
+
+    return GameResult(
+        winner_seat=winner_seat,
+        num_turns=num_turns,
+        rewards=[agent.get_total_reward() for agent in agents]
+    )
+
+def _play_chunk(seat_config: List[str], first_game_idx: int, num_games: int, max_turns: int, seed: int,
+                rules: Rules = DEFAULT_RULES) -> BatchResult:
+    result = BatchResult(seat_config=seat_config, seed=seed)
+    logger = NullLogger()
+    agents: List[Agent] = [AGENT_TYPES[agent_name]() for agent_name in seat_config]
+    for game_idx in range(first_game_idx, first_game_idx + num_games):
+        result.add_game(play_game(agents, logger, max_turns, seed, game_idx, rules=rules))
+
+    return result
+
+def run_batch(seat_config: Sequence[str], num_games: int, num_workers: Optional[int] = None,
+              chunk_size: int = 250, max_turns: int = 1000, seed: Optional[int] = None,
+              rules: Rules = DEFAULT_RULES) -> BatchResult:
+    # game i of the batch can be replayed with play_game(..., seed=result.seed, game_idx=i)
+    seat_config = list(seat_config)
+    if len(seat_config) < 2:
+        raise ValueError("A game needs at least two seats")
+    if len(seat_config) > rules.max_players:
+        raise ValueError(f"The rules allow at most {rules.max_players} seats")
+    for agent_name in seat_config:
+        if agent_name not in AGENT_TYPES:
+            raise ValueError(f"{agent_name} is not a known agent type")
+
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 63)
+
+    chunks: List[Tuple[int, int]] = [(first_game_idx, min(chunk_size, num_games - first_game_idx))
+                                     for first_game_idx in range(0, num_games, chunk_size)]
+
+    result = BatchResult(seat_config=seat_config, seed=seed)
+    if num_workers == 1:
+        for first_game_idx, chunk in chunks:
+            result.merge(_play_chunk(seat_config, first_game_idx, chunk, max_turns, seed, rules))
+        return result
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(_play_chunk, seat_config, first_game_idx, chunk, max_turns, seed, rules)
+                   for first_game_idx, chunk in chunks]
+        for future in futures:
+            result.merge(future.result())
+
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many headless games and report aggregated results")
+    parser.add_argument("seats", nargs="+", choices=sorted(AGENT_TYPES), help="agent type for each seat")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=250)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--decks", type=int, default=1, help="standard decks shuffled together, more decks allow more seats")
+    parser.add_argument("--starting-coins", type=int, default=2)
+    parser.add_argument("--coup-cost", type=int, default=7)
+    parser.add_argument("--forced-coup-coins", type=int, default=10)
+    args = parser.parse_args()
+
+    rules = Rules(decks=args.decks, starting_coins=args.starting_coins, coup_cost=args.coup_cost,
+                  forced_coup_coins=args.forced_coup_coins)
+    print(run_batch(args.seats, args.games, args.workers, args.chunk_size, args.max_turns, args.seed, rules))
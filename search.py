@@ -0,0 +1,145 @@
+from utils import Character, Claim, GameState, PlayerPerspective, Rules, DEFAULT_RULES
+from actions import ActionTable
+from agents import Agent, RandomAgent
+from encoding import PerspectiveEncoder
+from game import Game
+from logger import NullLogger
+
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+import math
+import random
+import time
+
+NodeStats = Dict[Claim, Tuple[int, float, int]]
+
+# one node per decision of the searching player, children are keyed by the claim taken there.
+# opponents' moves and hidden cards are not branched on, every iteration samples them instead
+class Node:
+    __slots__ = ("children", "visits", "wins", "availability")
+
+    def __init__(self) -> None:
+        self.children: Dict[Claim, Node] = {}
+        self.visits: int = 0
+        self.wins: float = 0.0
+        self.availability: Dict[Claim, int] = {}
+
+    def stats(self) -> NodeStats:
+        return {claim: (child.visits, child.wins, self.availability.get(claim, 0)) for claim, child in self.children.items()}
+
+    def merge(self, stats: NodeStats) -> None:
+        for claim, (visits, wins, availability) in stats.items():
+            child = self.children.get(claim)
+            if child is None:
+                child = Node()
+                self.children[claim] = child
+            child.visits += visits
+            child.wins += wins
+            self.availability[claim] = self.availability.get(claim, 0) + availability
+
+class TreePolicyAgent(RandomAgent):
+    # plays the searching player during a rollout: actions are selected in the tree until a new
+    # node is expanded, everything else is played at random
+    def __init__(self, exploration: float, rng: Optional[random.Random] = None) -> None:
+        super().__init__(rng, trajectory_capacity=0)
+        self._exploration: float = exploration
+        self._node: Optional[Node] = None
+        self._path: List[Node] = []
+
+    def start(self, root: Node) -> None:
+        self._node = root
+        self._path = [root]
+
+    def backpropagate(self, reward: float) -> None:
+        for node in self._path:
+            node.visits += 1
+            node.wins += reward
+
+    def choose_action(self, legal_claims: Sequence[Claim], player_perspective: Optional[PlayerPerspective]) -> Claim:
+        node: Optional[Node] = self._node
+        if node is None:
+            return super().choose_action(legal_claims, player_perspective)
+
+        for claim in legal_claims:
+            node.availability[claim] = node.availability.get(claim, 0) + 1
+
+        unexpanded: List[Claim] = [claim for claim in legal_claims if claim not in node.children]
+        if unexpanded:
+            claim = self._rng.choice(unexpanded)
+            child = Node()
+            node.children[claim] = child
+            self._path.append(child)
+            self._node = None
+            return claim
+
+        claim = max(legal_claims, key=lambda legal_claim: self._ucb(node, legal_claim))
+        self._node = node.children[claim]
+        self._path.append(self._node)
+        return claim
+
+    def _ucb(self, node: Node, claim: Claim) -> float:
+        child: Node = node.children[claim]
+        if child.visits == 0:
+            return math.inf
+        return child.wins / child.visits + self._exploration * math.sqrt(math.log(node.availability[claim]) / child.visits)
+
+def determinize(player_perspective: PlayerPerspective, rng: random.Random,
+                rules: Rules = DEFAULT_RULES) -> Tuple[Dict[str, List[Character]], List[Character]]:
+    # deals the cards the player cannot see at random: opponents get one hidden card per
+    # influence they still have, the rest forms the deck
+    game_state: GameState = player_perspective.game_state
+    unseen = Counter(rules.deck())
+    unseen.subtract(player_perspective.hidden_characters)
+    unseen.subtract(game_state.revealed_characters)
+    cards: List[Character] = list(unseen.elements())
+    rng.shuffle(cards)
+
+    hands: Dict[str, List[Character]] = {player_perspective.name: list(player_perspective.hidden_characters)}
+    for name in game_state.turn_order:
+        if name == player_perspective.name:
+            continue
+        player_state = game_state.player_states[name]
+        num_hidden: int = max(0, 2 - len(player_state.revealed_characters)) if player_state.in_game else 0
+        hands[name] = [cards.pop() for _ in range(num_hidden)]
+
+    return hands, cards
+
+def run_search(root: Node, player_perspective: PlayerPerspective, iterations: int, time_budget: Optional[float],
+               exploration: float, rng: random.Random, max_turns: int = 200, rules: Rules = DEFAULT_RULES) -> None:
+    # plays determinized games from the start of the searching player's turn until either budget runs out
+    game_state: GameState = player_perspective.game_state
+    names: List[str] = list(game_state.player_states)
+    action_table = ActionTable(names, rules)
+    encoder = PerspectiveEncoder(names, rules.max_players)
+    logger = NullLogger()
+
+    tree_agent = TreePolicyAgent(exploration, rng)
+    agents: Dict[str, Agent] = {name: RandomAgent(rng, trajectory_capacity=0) for name in names}
+    agents[player_perspective.name] = tree_agent
+
+    deadline: Optional[float] = time.perf_counter() + time_budget if time_budget is not None else None
+    for iteration in range(iterations):
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+
+        hands, deck = determinize(player_perspective, rng, rules)
+        game = Game.from_state(game_state, hands, deck, agents, action_table, encoder, rng, record_rewards=False)
+        tree_agent.start(root)
+
+        num_turns: int = 0
+        while game.game_is_active() and num_turns < max_turns:
+            game.handle_action(logger)
+            game.goto_next_player()
+            num_turns += 1
+            if game.get_players_left() <= 1:
+                game.declare_winner(logger)
+
+        winner = game.get_winner()
+        tree_agent.backpropagate(1.0 if winner == player_perspective.name else 0.0)
+
+def search_in_worker(player_perspective: PlayerPerspective, iterations: int, time_budget: Optional[float],
+                     exploration: float, seed: int, max_turns: int, rules: Rules = DEFAULT_RULES) -> NodeStats:
+    # root parallel search, every worker grows its own tree and only the root statistics are merged
+    root = Node()
+    run_search(root, player_perspective, iterations, time_budget, exploration, random.Random(seed), max_turns, rules)
+    return root.stats()
@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from agents import Agent, RandomAgent, RuleBasedAgent
+from events import EventLogger
+from policy_server import PolicyServer, ServedAgent, random_policy
+from runner import play_game
+
+# concurrent challenge and block polling must play every seeded game exactly like the sequential engine
+
+def _play(agents: Sequence[Agent], game_idx: int, poll_executor: Optional[ThreadPoolExecutor]) -> Tuple[object, ...]:
+    logger = EventLogger()
+    result = play_game(agents, logger, seed=7, game_idx=game_idx, poll_executor=poll_executor)
+    return result, logger.drain()
+
+def _served_games(poll_executor: Optional[ThreadPoolExecutor]) -> List[Tuple[object, ...]]:
+    with PolicyServer(random_policy(seed=3), max_batch_size=8) as server:
+        agents: List[Agent] = [ServedAgent(server) for _ in range(4)]
+        return [_play(agents, game_idx, poll_executor) for game_idx in range(40)]
+
+def test_served_agents_poll_like_the_sequential_engine() -> None:
+    sequential = _served_games(None)
+    with ThreadPoolExecutor(8) as poll_executor:
+        assert _served_games(poll_executor) == sequential
+
+def test_local_agents_poll_like_the_sequential_engine() -> None:
+    agents: List[Agent] = [RandomAgent(), RuleBasedAgent(), RandomAgent(), RuleBasedAgent(), RandomAgent()]
+    with ThreadPoolExecutor(8) as poll_executor:
+        for game_idx in range(100):
+            sequential = _play(agents, game_idx, None)
+            sequential_trajectories = [len(agent.get_trajectory()) for agent in agents]
+            assert _play(agents, game_idx, poll_executor) == sequential
+            assert [len(agent.get_trajectory()) for agent in agents] == sequential_trajectories
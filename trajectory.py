@@ -0,0 +1,119 @@
+from utils import Claim, PlayerPerspective
+from actions import ActionTable
+from encoding import PerspectiveEncoder, OBSERVATION_DTYPE
+
+from typing import Iterator, Optional, Sequence, Tuple
+import numpy as np
+
+DEFAULT_CAPACITY: int = 4096
+
+Step = Tuple[Claim, Tuple[Claim, ...], PlayerPerspective]
+
+# ring buffer of decisions stored as columns: the chosen claim id, the legal claims as a packed
+# bitmask and the encoded perspective, once full the oldest decisions are overwritten.
+# a capacity of 0 records nothing, which is what rollout agents want
+class TrajectoryBuffer:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        assert capacity >= 0
+
+        self._capacity: int = capacity
+        self._num_added: int = 0
+        self._action_table: Optional[ActionTable] = None
+        self._encoder: Optional[PerspectiveEncoder] = None
+        self._action_ids: np.ndarray = np.zeros(capacity, dtype=np.int32)
+        self._seats: np.ndarray = np.zeros(capacity, dtype=np.int16)
+        self._legal_masks: np.ndarray = np.zeros((capacity, 0), dtype=np.uint8)
+        self._observations: np.ndarray = np.zeros((capacity, 0), dtype=OBSERVATION_DTYPE)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def bind(self, action_table: ActionTable, encoder: PerspectiveEncoder) -> None:
+        # the columns are sized for the game the owner is about to play
+        if self._capacity == 0:
+            return
+
+        mask_bytes: int = (action_table.num_actions + 7) // 8
+        resized: bool = mask_bytes != self._legal_masks.shape[1] or encoder.width != self._observations.shape[1]
+        if resized and len(self) > 0:
+            raise ValueError("The trajectory must be cleared before binding it to a game with a different action or observation size")
+
+        self._action_table = action_table
+        self._encoder = encoder
+        if resized:
+            self._legal_masks = np.zeros((self._capacity, mask_bytes), dtype=np.uint8)
+            self._observations = np.zeros((self._capacity, encoder.width), dtype=OBSERVATION_DTYPE)
+
+    def append(self, claim: Claim, legal_mask: int, player_perspective: PlayerPerspective) -> None:
+        if self._capacity == 0:
+            return
+        assert self._action_table is not None and self._encoder is not None
+
+        row: int = self._num_added % self._capacity
+        self._action_ids[row] = self._action_table.claim_id(claim)
+        self._seats[row] = self._encoder.seat(player_perspective.name)
+        self._legal_masks[row] = np.frombuffer(legal_mask.to_bytes(self._legal_masks.shape[1], "little"), dtype=np.uint8)
+        self._observations[row] = 0
+        self._encoder.encode_into(player_perspective, self._observations[row])
+        self._num_added += 1
+
+    def clear(self) -> None:
+        self._num_added = 0
+
+    def __len__(self) -> int:
+        return min(self._num_added, self._capacity)
+
+    def action_ids(self) -> np.ndarray:
+        return self._action_ids[self._order()]
+
+    def legal_masks(self) -> np.ndarray:
+        # [decision, claim id] booleans
+        assert self._action_table is not None
+        packed = self._legal_masks[self._order()]
+        return np.unpackbits(packed, axis=1, bitorder="little")[:, :self._action_table.num_actions].astype(bool)
+
+    def observations(self) -> np.ndarray:
+        return self._observations[self._order()]
+
+    def step(self, idx: int) -> Step:
+        # decodes one decision, perspectives are rebuilt with the currently bound table and encoder
+        assert self._action_table is not None and self._encoder is not None
+        if not 0 <= idx < len(self):
+            raise IndexError(f"There is no decision {idx}")
+
+        row: int = idx if self._num_added <= self._capacity else (self._num_added + idx) % self._capacity
+        legal_mask: int = int.from_bytes(self._legal_masks[row].tobytes(), "little")
+        legal_claims: Tuple[Claim, ...] = tuple(self._action_table.claim(claim_id)
+                                                for claim_id in range(self._action_table.num_actions)
+                                                if (legal_mask >> claim_id) & 1)
+        name: str = self._encoder.names[self._seats[row]]
+        return (self._action_table.claim(int(self._action_ids[row])), legal_claims,
+                self._encoder.decode(self._observations[row], name))
+
+    def view(self) -> "TrajectoryView":
+        return TrajectoryView(self)
+
+    def _order(self) -> np.ndarray:
+        if self._num_added <= self._capacity:
+            return np.arange(self._num_added)
+        return (np.arange(self._capacity) + self._num_added) % self._capacity
+
+class TrajectoryView(Sequence[Step]):
+    # sequence of (claim, legal claims, perspective) decoded on access
+    def __init__(self, buffer: TrajectoryBuffer) -> None:
+        self._buffer: TrajectoryBuffer = buffer
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._buffer.step(i) for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        return self._buffer.step(idx)
+
+    def __iter__(self) -> Iterator[Step]:
+        for idx in range(len(self)):
+            yield self._buffer.step(idx)
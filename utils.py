@@ -1,6 +1,12 @@
 from enum import Enum, auto
-from typing import List, Dict, Optional
+from typing import Dict, Mapping, Optional, Tuple
 from dataclasses import dataclass, field
+from types import MappingProxyType
+import random
+
+def derive_rng(master_seed: int, game_idx: int, stream: int = 0) -> random.Random:
+    # string seeds are hashed with sha512, so the stream is the same in every process
+    return random.Random(f"{master_seed}:{game_idx}:{stream}")
 
 # character            active                passive
 # ambassador  |  exchange characters |  block stealing
@@ -15,6 +21,43 @@ class Character(Enum):
     DUKE = auto()
     ASSASSIN = auto()
 
+# three copies of every character
+STANDARD_DECK: Tuple[Character, ...] = tuple(character for character in (Character.CONTESSA, Character.ASSASSIN, Character.AMBASSADOR,
+                                                                          Character.CAPTAIN, Character.DUKE)
+                                             for _ in range(3))
+
+@dataclass(frozen=True)
+class Rules:
+    # decks is the number of standard decks shuffled together. every player needs two cards and
+    # an exchange draws up to two more, which bounds max_players, 0 means as many as fit
+    decks: int = 1
+    starting_coins: int = 2
+    assassination_cost: int = 3
+    coup_cost: int = 7
+    forced_coup_coins: int = 10
+    max_players: int = 0
+
+    def __post_init__(self) -> None:
+        if self.decks < 1:
+            raise ValueError("A game needs at least one deck")
+        if not 1 <= self.assassination_cost <= self.coup_cost <= self.forced_coup_coins:
+            raise ValueError("The coup cost must lie between the assassination cost and the forced coup threshold")
+
+        player_limit: int = (len(STANDARD_DECK) * self.decks - 2) // 2
+        if self.max_players == 0:
+            object.__setattr__(self, "max_players", player_limit)
+        elif not 2 <= self.max_players <= player_limit:
+            raise ValueError(f"{self.decks} deck(s) hold between 2 and {player_limit} players")
+
+    @property
+    def copies_per_character(self) -> int:
+        return 3 * self.decks
+
+    def deck(self) -> Tuple[Character, ...]:
+        return STANDARD_DECK * self.decks
+
+DEFAULT_RULES: Rules = Rules()
+
 class Action(Enum):
     INCOME = auto()
     FOREIGN_AID = auto()
@@ -29,6 +72,17 @@ class Action(Enum):
     CALL_BULLSHIT = auto()
     NO_RESPONSE = auto()
 
+# characters that back up each claim when it is challenged
+CLAIMED_CHARACTERS: Dict[Action, Tuple[Character, ...]] = {
+    Action.EXCHANGE: (Character.AMBASSADOR,),
+    Action.TAX: (Character.DUKE,),
+    Action.ASSASSINATE: (Character.ASSASSIN,),
+    Action.STEAL: (Character.CAPTAIN,),
+    Action.BLOCK_ASSASSINATE: (Character.CONTESSA,),
+    Action.BLOCK_STEALING: (Character.CAPTAIN, Character.AMBASSADOR),
+    Action.BLOCK_FOREIGN_AID: (Character.DUKE,),
+}
+
 @dataclass(frozen=True)
 class Claim:
     action: Action
@@ -39,19 +93,30 @@ class Block:
     claim: Claim
     instigator: str
 
-@dataclass
+# snapshots are immutable so the engine can hand the same instance to every perspective,
+# unchanged player states are shared between consecutive snapshots
+@dataclass(frozen=True)
 class PlayerState:
     coins: int = 0
-    revealed_characters: List[Character] = field(default_factory=list)
+    revealed_characters: Tuple[Character, ...] = ()
     in_game: bool = False
 
-@dataclass
+@dataclass(frozen=True)
 class GameState:
     current_player: str = ""
     num_players_alive: int = 0
-    turn_order: List[str] = field(default_factory=list)
-    player_states: Dict[str, PlayerState] = field(default_factory=dict)
-    revealed_characters: List[Character] = field(default_factory=list)
+    turn_order: Tuple[str, ...] = ()
+    player_states: Mapping[str, PlayerState] = field(default_factory=dict)
+    revealed_characters: Tuple[Character, ...] = ()
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.player_states, MappingProxyType):
+            object.__setattr__(self, "player_states", MappingProxyType(dict(self.player_states)))
+
+    def __reduce__(self):
+        # mappingproxy cannot be pickled, so rebuild from a plain dict
+        return (GameState, (self.current_player, self.num_players_alive, self.turn_order,
+                            dict(self.player_states), self.revealed_characters))
 
     def __str__(self):
         state_lines = [
@@ -69,11 +134,24 @@ class GameState:
         state_lines.append(f"Revealed Characters: [{revealed_characters}]")
         return "\n".join(state_lines)
 
-@dataclass
+@dataclass(frozen=True)
 class PlayerPerspective:
+    # a read-only view, the engine hands the same perspective to a seat until its snapshot or hand
+    # changes. the hand is a tuple and the fields cannot be assigned, so agents cannot change a
+    # perspective another seat or a stored trajectory still holds
+    __slots__ = ("game_state", "name", "hidden_characters")
+
     game_state: GameState
     name: str
-    hidden_characters: List[Character]
+    hidden_characters: Tuple[Character, ...]
+
+    # pickling restores slots with setattr, which a frozen dataclass refuses
+    def __getstate__(self) -> Tuple[GameState, str, Tuple[Character, ...]]:
+        return (self.game_state, self.name, self.hidden_characters)
+
+    def __setstate__(self, state: Tuple[GameState, str, Tuple[Character, ...]]) -> None:
+        for field_name, value in zip(self.__slots__, state):
+            object.__setattr__(self, field_name, value)
 
     def __str__(self):
         hidden = ", ".join(c.name for c in self.hidden_characters) or "None"
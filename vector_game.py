@@ -0,0 +1,313 @@
+from utils import Action, Character, Rules, DEFAULT_RULES
+from encoding import CHARACTER_INDEX, NUM_CHARACTERS
+
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# action codes used by the batched engine
+INCOME: int = 0
+FOREIGN_AID: int = 1
+TAX: int = 2
+ASSASSINATE: int = 3
+STEAL: int = 4
+EXCHANGE: int = 5
+COUP: int = 6
+VECTOR_ACTIONS: List[Action] = [Action.INCOME, Action.FOREIGN_AID, Action.TAX, Action.ASSASSINATE,
+                                Action.STEAL, Action.EXCHANGE, Action.COUP]
+
+NONE: int = -1
+
+AMBASSADOR: int = CHARACTER_INDEX[Character.AMBASSADOR]
+CONTESSA: int = CHARACTER_INDEX[Character.CONTESSA]
+CAPTAIN: int = CHARACTER_INDEX[Character.CAPTAIN]
+DUKE: int = CHARACTER_INDEX[Character.DUKE]
+ASSASSIN: int = CHARACTER_INDEX[Character.ASSASSIN]
+
+# character needed to survive a challenge of the action, NONE if it cannot be challenged
+ACTION_CHARACTER = np.array([NONE, NONE, DUKE, ASSASSIN, CAPTAIN, AMBASSADOR, NONE])
+# characters that may block the action, NONE where there is no block or no second option
+BLOCK_CHARACTER = np.array([NONE, DUKE, NONE, CONTESSA, CAPTAIN, NONE, NONE])
+BLOCK_ALTERNATIVE_CHARACTER = np.array([NONE, NONE, NONE, NONE, AMBASSADOR, NONE, NONE])
+
+# claim columns of the legality matrix: the untargeted actions, then steal/assassinate/coup per seat
+UNTARGETED_ACTIONS: List[int] = [INCOME, FOREIGN_AID, TAX, EXCHANGE]
+TARGETED_ACTIONS: List[int] = [STEAL, ASSASSINATE, COUP]
+
+class VectorGame:
+    # plays num_games games in lockstep, every game has the same number of seats and all
+    # per game state lives in arrays indexed by [game, seat, character]
+    def __init__(self, num_games: int, num_players: int, seed: Optional[int] = None, rules: Rules = DEFAULT_RULES) -> None:
+        assert num_players > 1
+        if num_players > rules.max_players:
+            raise ValueError(f"The rules allow at most {rules.max_players} players")
+
+        self._num_games: int = num_games
+        self._num_players: int = num_players
+        self._rules: Rules = rules
+        # coins gained by the instigator of each action code when it resolves, steals are handled apart
+        self._coin_delta: np.ndarray = np.array([1, 2, 3, -rules.assassination_cost, 0, 0, -rules.coup_cost])
+        self._rng: np.random.Generator = np.random.default_rng(seed)
+
+        self.coins: np.ndarray = np.zeros((num_games, num_players), dtype=np.int16)
+        self.hands: np.ndarray = np.zeros((num_games, num_players, NUM_CHARACTERS), dtype=np.int8)
+        self.revealed: np.ndarray = np.zeros((num_games, num_players, NUM_CHARACTERS), dtype=np.int8)
+        self.deck: np.ndarray = np.zeros((num_games, NUM_CHARACTERS), dtype=np.int8)
+        self.current: np.ndarray = np.zeros(num_games, dtype=np.int64)
+        self.done: np.ndarray = np.zeros(num_games, dtype=bool)
+        self.winner: np.ndarray = np.full(num_games, NONE, dtype=np.int64)
+        self.turns: np.ndarray = np.zeros(num_games, dtype=np.int32)
+
+        num_claims: int = len(UNTARGETED_ACTIONS) + len(TARGETED_ACTIONS) * num_players
+        self._claim_actions: np.ndarray = np.array(UNTARGETED_ACTIONS + TARGETED_ACTIONS * num_players)
+        self._claim_targets: np.ndarray = np.full(num_claims, NONE)
+        self._claim_targets[len(UNTARGETED_ACTIONS):] = np.repeat(np.arange(num_players), len(TARGETED_ACTIONS))
+
+        self.reset()
+
+    @property
+    def num_games(self) -> int:
+        return self._num_games
+
+    @property
+    def num_players(self) -> int:
+        return self._num_players
+
+    def alive(self) -> np.ndarray:
+        return self.hands.sum(axis=2) > 0
+
+    def reset(self) -> None:
+        every_game = np.arange(self._num_games)
+        self.coins[:] = self._rules.starting_coins
+        self.hands[:] = 0
+        self.revealed[:] = 0
+        self.deck[:] = self._rules.copies_per_character
+        for seat in range(self._num_players):
+            seats = np.full(self._num_games, seat)
+            self._draw(every_game, seats)
+            self._draw(every_game, seats)
+
+        self.current[:] = self._rng.integers(self._num_players, size=self._num_games)
+        self.done[:] = False
+        self.winner[:] = NONE
+        self.turns[:] = 0
+
+    def step(self, actions: np.ndarray, targets: np.ndarray, challengers: np.ndarray,
+             blockers: np.ndarray, block_challengers: np.ndarray) -> None:
+        # every argument holds one entry per game, seats are NONE when nobody challenges or blocks,
+        # entries of finished games are ignored
+        games = np.flatnonzero(~self.done)
+        if len(games) == 0:
+            return
+
+        instigators = self.current[games]
+        actions = np.asarray(actions)[games]
+        targets = np.asarray(targets)[games]
+        proceed = np.ones(len(games), dtype=bool)
+
+        # challenge of the claimed character
+        challengers = np.asarray(challengers)[games]
+        claimed = ACTION_CHARACTER[actions]
+        challenged = np.flatnonzero((challengers != NONE) & (claimed != NONE))
+        if len(challenged):
+            truthful = self.hands[games[challenged], instigators[challenged], claimed[challenged]] > 0
+            lied = challenged[~truthful]
+            proven = challenged[truthful]
+            self._lose_influence(games[lied], instigators[lied])
+            self._lose_influence(games[proven], challengers[proven])
+            self._swap_card(games[proven], instigators[proven])
+            proceed[lied] = False
+
+        # block, and the challenge of the block
+        blockers = np.asarray(blockers)[games]
+        blocked = np.flatnonzero(proceed & (blockers != NONE) & (BLOCK_CHARACTER[actions] != NONE))
+        if len(blocked):
+            block_games = games[blocked]
+            block_seats = blockers[blocked]
+            block_truthful = self.hands[block_games, block_seats, BLOCK_CHARACTER[actions[blocked]]] > 0
+            alternative = BLOCK_ALTERNATIVE_CHARACTER[actions[blocked]]
+            has_alternative = alternative != NONE
+            block_truthful[has_alternative] |= self.hands[block_games[has_alternative], block_seats[has_alternative],
+                                                          alternative[has_alternative]] > 0
+
+            block_challengers = np.asarray(block_challengers)[games][blocked]
+            block_challenged = block_challengers != NONE
+            proven = block_challenged & block_truthful
+            lied = block_challenged & ~block_truthful
+            self._lose_influence(block_games[proven], block_challengers[proven])
+            self._swap_card(block_games[proven], block_seats[proven])
+            self._lose_influence(block_games[lied], block_seats[lied])
+
+            stands = blocked[~lied]
+            proceed[stands] = False
+
+            # the assassin pays even when the block stands
+            paid = stands[actions[stands] == ASSASSINATE]
+            self.coins[games[paid], instigators[paid]] -= self._rules.assassination_cost
+
+        # resolve the actions that went through
+        resolved = np.flatnonzero(proceed)
+        resolved_games = games[resolved]
+        resolved_instigators = instigators[resolved]
+        resolved_actions = actions[resolved]
+        resolved_targets = targets[resolved]
+        self.coins[resolved_games, resolved_instigators] += self._coin_delta[resolved_actions]
+
+        stealing = resolved_actions == STEAL
+        if stealing.any():
+            steal_games = resolved_games[stealing]
+            steal_targets = resolved_targets[stealing]
+            stolen = np.minimum(2, self.coins[steal_games, steal_targets])
+            self.coins[steal_games, steal_targets] -= stolen
+            self.coins[steal_games, resolved_instigators[stealing]] += stolen
+
+        killing = (resolved_actions == ASSASSINATE) | (resolved_actions == COUP)
+        self._lose_influence(resolved_games[killing], resolved_targets[killing])
+
+        exchanging = resolved_actions == EXCHANGE
+        if exchanging.any():
+            self._exchange(resolved_games[exchanging], resolved_instigators[exchanging])
+
+        self._advance(games)
+
+    def legal_claims(self) -> np.ndarray:
+        # [game, claim] legality of the claims the current player may make, see claim_action/claim_target
+        seats = np.arange(self._num_players)
+        coins = self.coins[np.arange(self._num_games), self.current]
+        targetable = self.alive() & (seats[None, :] != self.current[:, None])
+
+        legal = np.zeros((self._num_games, len(self._claim_actions)), dtype=bool)
+        not_forced = coins < self._rules.forced_coup_coins
+        legal[:, :len(UNTARGETED_ACTIONS)] = not_forced[:, None]
+        per_target = legal[:, len(UNTARGETED_ACTIONS):].reshape(self._num_games, self._num_players, len(TARGETED_ACTIONS))
+        per_target[:, :, 0] = targetable & not_forced[:, None]
+        per_target[:, :, 1] = targetable & ((coins >= self._rules.assassination_cost) & not_forced)[:, None]
+        per_target[:, :, 2] = targetable & (coins >= self._rules.coup_cost)[:, None]
+        legal[self.done] = False
+        return legal
+
+    def claim_action(self, claims: np.ndarray) -> np.ndarray:
+        return self._claim_actions[claims]
+
+    def claim_target(self, claims: np.ndarray) -> np.ndarray:
+        return self._claim_targets[claims]
+
+    def sample_decisions(self, rule_based_seats: Sequence[int] = ()) -> Dict[str, np.ndarray]:
+        # mirrors RandomAgent, seats listed in rule_based_seats choose their action like RuleBasedAgent
+        every_game = np.arange(self._num_games)
+        alive = self.alive()
+        not_current = np.arange(self._num_players)[None, :] != self.current[:, None]
+
+        legal = self.legal_claims()
+        claims = self._sample(legal)
+        claims[claims == NONE] = 0
+        actions = self._claim_actions[claims]
+        targets = self._claim_targets[claims]
+
+        if len(rule_based_seats):
+            rule_based = np.isin(self.current, rule_based_seats)
+            rule_actions, rule_targets = self._rule_based_actions(legal)
+            has_rule = rule_based & (rule_actions != NONE)
+            actions = np.where(has_rule, rule_actions, actions)
+            targets = np.where(has_rule, rule_targets, targets)
+
+        # every eligible player challenges with probability 1/2, the first of them in a random order wins
+        challengers = self._sample((self._rng.random(alive.shape) < 0.5) & alive & not_current)
+        block_votes = (self._rng.random(alive.shape) < 0.5) & alive & not_current
+        target_blocks = block_votes[every_game, np.maximum(targets, 0)]
+        blockers = np.where(actions == FOREIGN_AID, self._sample(block_votes),
+                            np.where(target_blocks & (targets != NONE), targets, NONE))
+
+        not_blocker = np.arange(self._num_players)[None, :] != blockers[:, None]
+        block_challengers = self._sample((self._rng.random(alive.shape) < 0.5) & alive & not_blocker)
+
+        return {
+            "actions": actions,
+            "targets": targets,
+            "challengers": challengers,
+            "blockers": blockers,
+            "block_challengers": block_challengers
+        }
+
+    def play(self, rule_based_seats: Sequence[int] = (), max_turns: int = 1000) -> None:
+        while not self.done.all() and self.turns.max() < max_turns:
+            self.step(**self.sample_decisions(rule_based_seats))
+
+    def _rule_based_actions(self, legal: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        every_game = np.arange(self._num_games)
+        current_hand = self.hands[every_game, self.current]
+        opponents = self.alive() & (np.arange(self._num_players)[None, :] != self.current[:, None])
+        opponent_coins = np.where(opponents, self.coins, -1)
+        richest = opponent_coins.argmax(axis=1)
+        richest[opponent_coins.max(axis=1) <= 0] = NONE
+
+        per_target = legal[:, len(UNTARGETED_ACTIONS):].reshape(self._num_games, self._num_players, len(TARGETED_ACTIONS))
+        richest_legal = per_target[every_game, np.maximum(richest, 0)] & (richest != NONE)[:, None]
+
+        actions = np.full(self._num_games, NONE)
+        targets = np.full(self._num_games, NONE)
+        # later rules are applied first so the earlier ones take priority
+        assassinate = (current_hand[:, ASSASSIN] > 0) & richest_legal[:, 1]
+        actions[assassinate], targets[assassinate] = ASSASSINATE, richest[assassinate]
+        steal = (current_hand[:, CAPTAIN] > 0) & richest_legal[:, 0]
+        actions[steal], targets[steal] = STEAL, richest[steal]
+        tax = (current_hand[:, DUKE] > 0) & legal[:, UNTARGETED_ACTIONS.index(TAX)]
+        actions[tax], targets[tax] = TAX, NONE
+        coup = richest_legal[:, 2]
+        actions[coup], targets[coup] = COUP, richest[coup]
+        return actions, targets
+
+    def _sample(self, weights: np.ndarray) -> np.ndarray:
+        # index drawn per row in proportion to the (integer) weights, NONE for all zero rows
+        totals = weights.sum(axis=1)
+        draws = (self._rng.random(len(weights)) * totals).astype(np.int64)
+        choice = (np.cumsum(weights, axis=1) > draws[:, None]).argmax(axis=1)
+        return np.where(totals > 0, choice, NONE)
+
+    def _lose_influence(self, games: np.ndarray, seats: np.ndarray) -> None:
+        if len(games) == 0:
+            return
+        characters = self._sample(self.hands[games, seats])
+        has_card = characters != NONE
+        games, seats, characters = games[has_card], seats[has_card], characters[has_card]
+        self.hands[games, seats, characters] -= 1
+        self.revealed[games, seats, characters] += 1
+
+    def _draw(self, games: np.ndarray, seats: np.ndarray) -> None:
+        if len(games) == 0:
+            return
+        characters = self._sample(self.deck[games])
+        self.deck[games, characters] -= 1
+        self.hands[games, seats, characters] += 1
+
+    def _return_card(self, games: np.ndarray, seats: np.ndarray) -> None:
+        if len(games) == 0:
+            return
+        characters = self._sample(self.hands[games, seats])
+        self.hands[games, seats, characters] -= 1
+        self.deck[games, characters] += 1
+
+    def _swap_card(self, games: np.ndarray, seats: np.ndarray) -> None:
+        self._draw(games, seats)
+        self._return_card(games, seats)
+
+    def _exchange(self, games: np.ndarray, seats: np.ndarray) -> None:
+        hand_sizes = self.hands[games, seats].sum(axis=1)
+        for round_idx in range(int(hand_sizes.max(initial=0))):
+            drawing = hand_sizes > round_idx
+            self._draw(games[drawing], seats[drawing])
+        for round_idx in range(int(hand_sizes.max(initial=0))):
+            returning = hand_sizes > round_idx
+            self._return_card(games[returning], seats[returning])
+
+    def _advance(self, games: np.ndarray) -> None:
+        self.turns[games] += 1
+        alive = self.alive()[games]
+        still_alive = alive.sum(axis=1)
+
+        finished = still_alive <= 1
+        self.done[games[finished]] = True
+        self.winner[games[finished]] = np.where(still_alive[finished] == 1, alive[finished].argmax(axis=1), NONE)
+
+        offsets = (self.current[games][:, None] + np.arange(1, self._num_players + 1)[None, :]) % self._num_players
+        next_alive = alive[np.arange(len(games))[:, None], offsets].argmax(axis=1)
+        self.current[games] = offsets[np.arange(len(games)), next_alive]